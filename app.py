@@ -1,436 +1,302 @@
-# app.py - Multi-Agent Game Generation System
+# app.py - Multi-Agent Game Generation System (Streamlit dashboard over the job queue)
 import streamlit as st
-import google.generativeai as genai
 import os
-from pathlib import Path
-import json
 import time
-from dotenv import load_dotenv
-import re
-import shutil # For potentially cleaning workspace
-from typing import TypedDict, List, Dict, Optional, Sequence
-from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver # For potential future state saving
+from collections import deque
+from pathlib import Path
+from urllib.parse import quote
+from typing import Dict, List, Optional
+from game_pipeline import (
+    MAX_GAMES, MAX_CONCURRENT_WORKERS, REUSE_UNCHANGED_GAMES, WORKER_BATCH_SIZE, WORKSPACE_DIR, GEMINI_RPM, model_name,
+    archive_run, build_graph, get_catalog, get_llm_cache, get_manifest, open_checkpointer,
+)
+from job_queue import JobQueue
+import metrics
+import event_log
+import game_server
+from game_store import folder_key
+import job_worker
 
-# --- Configuration ---
-st.set_page_config(layout="wide", page_title="AI Generátor Hier")
-load_dotenv()
+DASHBOARD_REFRESH_S = float(os.getenv("DASHBOARD_REFRESH_S", "2")) # Polling interval of the job list while jobs are active
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "25")) # Games per page of the catalog
 
-# --- Constants ---
-WORKSPACE_DIR = Path("workspace")
-WORKSPACE_DIR.mkdir(exist_ok=True)
-MAX_GAMES = 16 # Target number of games
+VALIDATION_LABELS = {None: "všetky", "ok": "✅ v poriadku", "repaired": "🔧 opravené", "failed": "⚠️ chybné", "": "nekontrolované"}
+STATUS_LABELS = {"queued": "⏳ čaká", "running": "⚙️ beží", "done": "✅ hotová", "failed": "⚠️ zlyhala", "cancelled": "🛑 zrušená"}
 
-# --- Gemini API Configuration ---
-try:
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        st.error("🔴 Google API kľúč nenájdený. Prosím, uistite sa, že GOOGLE_API_KEY je nastavený vo vašom .env súbore.")
-        st.stop()
-    genai.configure(api_key=api_key)
-    model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-pro-exp-03-25") # Using a potentially faster model
-    model = genai.GenerativeModel(model_name)
-    st.sidebar.caption(f"Používaný model: `{model_name}`")
-except Exception as e:
-    st.error(f"🔴 Nepodarilo sa nakonfigurovať Gemini alebo načítať model '{model_name}' pomocou .env: {e}")
-    st.stop()
+# --- Configuration ---
+st.set_page_config(layout="wide", page_title="AI Generátor Hier")
+st.sidebar.caption(f"Používaný model: `{model_name}`")
 
-# --- LangGraph State Definition ---
-class AgentState(TypedDict):
-    theme: str
-    game_concepts: Optional[List[str]]
-    game_plan: Optional[List[Dict[str, str]]] # List of {"concept": "...", "instruction": "..."}
-    current_game_index: int
-    worker_output: Optional[List[Dict[str, str]]] # Output from the worker agent for the current game
-    saved_games: List[Dict[str, str]] # List of {"name": "...", "folder": "..."}
-    log_messages: List[str]
-    error: Optional[str]
+@st.cache_resource
+def get_app_graph():
+    """Compiled graph with the SQLite checkpointer; the dashboard only reads run state from it, workers run it."""
+    return build_graph(checkpointer=open_checkpointer())
 
-# --- Helper Functions ---
-def sanitize_foldername(name: str) -> str:
-    """Creates a safe folder name from a game concept."""
-    name = re.sub(r'[^\w\s-]', '', name).strip().lower()
-    name = re.sub(r'[-\s]+', '_', name)
-    return name if name else "untitled_game"
+@st.cache_resource
+def get_job_queue():
+    """Connection to the job queue shared by all sessions and reruns."""
+    return JobQueue()
 
-def save_game_files(game_name: str, game_index: int, files_data: List[Dict[str, str]]) -> Optional[str]:
-    """Saves generated files to a dedicated game folder."""
-    folder_name = f"{sanitize_foldername(game_name)}_{game_index:02d}"
-    game_dir = WORKSPACE_DIR / folder_name
+@st.cache_resource
+def get_game_server():
+    """Static server for WORKSPACE_DIR, started once per Streamlit process; None if the port is taken."""
     try:
-        game_dir.mkdir(parents=True, exist_ok=True)
-        for file_info in files_data:
-            filename = file_info.get("filename")
-            content = file_info.get("content")
-            if filename and content is not None:
-                # Basic security check
-                if ".." in filename or filename.startswith(("/", "\\")):
-                    st.warning(f"⚠️ Preskočený nebezpečný názov súboru v hre {game_name}: {filename}")
-                    continue
-                filepath = game_dir / filename
-                filepath.parent.mkdir(parents=True, exist_ok=True) # Ensure subdirs within game folder are created
-                with open(filepath, "w", encoding="utf-8") as f:
-                    f.write(content)
-            else:
-                 st.warning(f"⚠️ Chýbajúce 'filename' alebo 'content' v dátach pre hru {game_name}: {file_info}")
-        return str(game_dir) # Return the path to the created directory
-    except Exception as e:
-        st.error(f"🔴 Chyba pri ukladaní súborov pre hru '{game_name}' do '{folder_name}': {e}")
+        return game_server.start_server(WORKSPACE_DIR)
+    except OSError as e:
+        st.sidebar.warning(f"⚠️ Server hier sa nepodarilo spustiť na porte {game_server.GAME_SERVER_PORT}: {e}")
         return None
 
-def call_llm(prompt: str, is_json_output: bool = True) -> str:
-    """ Helper function to call the LLM and handle potential errors. """
-    try:
-        # Simple retry mechanism
-        for attempt in range(2):
-            try:
-                response = model.generate_content(prompt)
-                # Basic validation if JSON is expected
-                if is_json_output:
-                    cleaned_response = response.text.strip()
-                    if cleaned_response.startswith("```json"):
-                        cleaned_response = cleaned_response[7:-3].strip()
-                    elif cleaned_response.startswith("```"):
-                         cleaned_response = cleaned_response[3:-3].strip()
-                    # Try parsing to catch invalid JSON early
-                    json.loads(cleaned_response)
-                    return cleaned_response
-                else:
-                    return response.text
-            except Exception as inner_e:
-                if "429" in str(inner_e) and attempt == 0:
-                    st.warning("⏳ Limit API prekročený, čakám 5 sekúnd pred opakovaním...")
-                    time.sleep(5)
-                    continue # Retry
-                elif is_json_output and isinstance(inner_e, json.JSONDecodeError):
-                     st.warning(f"⚠️ LLM vrátilo neplatný JSON, skúšam znova... Chyba: {inner_e}")
-                     if attempt == 0: continue # Retry on first JSON error
-                     else: raise # Raise error on second JSON failure
-                else:
-                    raise # Re-raise other errors or errors on second attempt
-        # If loop finishes without returning/raising (e.g., due to retries)
-        raise Exception("LLM volanie zlyhalo po opakovaniach.")
-
-    except Exception as e:
-        st.error(f"🔴 Volanie LLM zlyhalo: {e}")
-        # Return an error structure if JSON was expected
-        if is_json_output:
-            return json.dumps([{"action": "chat", "content": f"Chyba volania LLM: {e}"}])
-        else:
-            return f"Chyba volania LLM: {e}"
-
-# --- Agent Node Functions ---
-
-def games_planner_node(state: AgentState) -> AgentState:
-    """Generates a list of game concepts based on the theme."""
-    theme = state["theme"]
-    log_messages = state.get("log_messages", [])
-    log_messages.append(f"🤖 GAMES_PLANNER: Generujem {MAX_GAMES} konceptov hier pre tému '{theme}'...")
-    st.session_state.log_messages = log_messages # Update UI immediately
-
-    prompt = f"""
-    Si kreatívny plánovač hier. Vytvor zoznam {MAX_GAMES} jednoduchých konceptov webových hier (HTML, CSS, JS) na tému '{theme}'.
-    Zameraj sa na jednoduché, dobre známe herné mechaniky.
-    Odpovedz IBA platným JSON poľom reťazcov obsahujúcim názvy herných konceptov.
-
-    Príklad pre tému 'vesmír':
-    ["Hádaj planétu", "Vesmírny kliker", "Pexeso s kozmickými loďami", "Kvíz o súhvezdiach", ...]
-    """
-    try:
-        response_text = call_llm(prompt, is_json_output=True)
-        game_concepts = json.loads(response_text)
-        if not isinstance(game_concepts, list) or not all(isinstance(item, str) for item in game_concepts):
-            raise ValueError("LLM nevrátilo platný zoznam názvov hier.")
-        log_messages.append(f"✅ GAMES_PLANNER: Koncepty hier vygenerované ({len(game_concepts)} hier).")
-        return {**state, "game_concepts": game_concepts[:MAX_GAMES], "log_messages": log_messages, "error": None}
-    except Exception as e:
-        error_msg = f"🔴 GAMES_PLANNER zlyhal: {e}"
-        log_messages.append(error_msg)
-        return {**state, "log_messages": log_messages, "error": error_msg}
-
-def profesor_planner_node(state: AgentState) -> AgentState:
-    """Refines the game concepts with aesthetic instructions."""
-    game_concepts = state.get("game_concepts")
-    log_messages = state.get("log_messages", [])
-    if not game_concepts:
-        error_msg = "🔴 PROFESOR_PLANNER: Chýbajú herné koncepty."
-        log_messages.append(error_msg)
-        return {**state, "log_messages": log_messages, "error": error_msg}
-
-    log_messages.append("🧑‍🏫 PROFESOR_PLANNER: Pridávam inštrukcie pre vizuálnu stránku ku každému konceptu...")
-    st.session_state.log_messages = log_messages
-
-    game_plan = []
-    for concept in game_concepts:
-        instruction = (
-            f"Vytvor jednoduchú webovú hru '{concept}'. "
-            f"Prioritou je vytvoriť **vizuálne krásne a pútavé používateľské rozhranie (UI)** pomocou moderného CSS. "
-            f"Zahrň relevantnú **grafiku** (zváž SVG, CSS art alebo jednoduché obrázky, ak je to vhodné) a pútavé **CSS animácie**. "
-            f"Vzhľad a dojem sú dôležitejšie ako zložitá herná logika. Hra by mala byť hrateľná, ale jednoduchá."
-        )
-        game_plan.append({"concept": concept, "instruction": instruction})
-
-    log_messages.append("✅ PROFESOR_PLANNER: Herný plán s inštrukciami vytvorený.")
-    return {**state, "game_plan": game_plan, "log_messages": log_messages, "error": None}
-
-def worker_node(state: AgentState) -> AgentState:
-    """Generates the files for the current game based on the plan."""
-    game_plan = state.get("game_plan")
-    current_index = state.get("current_game_index", 0)
-    log_messages = state.get("log_messages", [])
-
-    if not game_plan or current_index >= len(game_plan):
-        error_msg = f"🔴 WORKER: Neplatný herný plán alebo index ({current_index})."
-        log_messages.append(error_msg)
-        return {**state, "log_messages": log_messages, "error": error_msg}
-
-    current_game = game_plan[current_index]
-    concept = current_game["concept"]
-    instruction = current_game["instruction"]
-    theme = state["theme"]
-
-    log_messages.append(f"👷 WORKER: Začínam generovať hru {current_index + 1}/{len(game_plan)}: '{concept}'...")
-    st.session_state.log_messages = log_messages
-
-    prompt = f"""
-    Si expert na vývoj webových hier (HTML, CSS, JavaScript). Tvojou úlohou je vytvoriť súbory pre jednoduchú webovú hru.
-
-    Téma: '{theme}'
-    Koncept hry: '{concept}'
-    Špecifické inštrukcie: '{instruction}'
-
-    Požiadavky na výstup:
-    1. Vygeneruj potrebné súbory (typicky index.html, style.css, script.js).
-    2. Zameraj sa na vizuálnu stránku podľa inštrukcií (krásne UI, grafika, animácie).
-    3. Udržuj kód jednoduchý a funkčný pre daný koncept.
-    4. Všetky súbory musia byť samostatné (žiadne externé závislosti okrem bežných prehliadačových API).
-    5. Odpovedz IBA platným JSON poľom objektov, kde každý objekt reprezentuje jeden súbor.
-       Formát objektu súboru: {{"filename": "nazov_suboru.ext", "content": "obsah súboru ako reťazec..."}}
-    6. Dôsledne dodržuj JSON formátovanie: dvojité úvodzovky pre kľúče a reťazce, správne escapovanie špeciálnych znakov (\\n, \\", atď.) v obsahu súboru.
-
-    Príklad JSON výstupu:
-    [
-      {{"filename": "index.html", "content": "<!DOCTYPE html>..."}},
-      {{"filename": "style.css", "content": "body {{ ... }}"}},
-      {{"filename": "script.js", "content": "console.log('Hello');"}}
-    ]
-    """
-
-    try:
-        response_text = call_llm(prompt, is_json_output=True)
-        files_data = json.loads(response_text)
-        if not isinstance(files_data, list) or not all(isinstance(item, dict) and "filename" in item and "content" in item for item in files_data):
-             raise ValueError("LLM nevrátilo platný zoznam súborov v JSON formáte.")
-
-        log_messages.append(f"✅ WORKER: Súbory pre '{concept}' vygenerované.")
-        return {**state, "worker_output": files_data, "log_messages": log_messages, "error": None}
-    except Exception as e:
-        error_msg = f"🔴 WORKER zlyhal pri generovaní '{concept}': {e}"
-        log_messages.append(error_msg)
-        # Still proceed to next game, but log the error
-        return {**state, "worker_output": None, "log_messages": log_messages, "error": error_msg} # Allow graph to continue
-
-def save_and_log_node(state: AgentState) -> AgentState:
-    """Saves the generated files and updates the list of saved games."""
-    worker_output = state.get("worker_output")
-    game_plan = state.get("game_plan")
-    current_index = state.get("current_game_index", 0)
-    saved_games = state.get("saved_games", [])
-    log_messages = state.get("log_messages", [])
-
-    if worker_output and game_plan and current_index < len(game_plan):
-        concept = game_plan[current_index]["concept"]
-        log_messages.append(f"💾 Ukladám súbory pre hru '{concept}'...")
-        st.session_state.log_messages = log_messages
-
-        game_dir = save_game_files(concept, current_index + 1, worker_output)
-
-        if game_dir:
-            saved_games.append({"name": concept, "folder": game_dir})
-            log_messages.append(f"✅ Hra '{concept}' uložená do '{Path(game_dir).name}'.")
-        else:
-            # Error logged in save_game_files
-            log_messages.append(f"❌ Nepodarilo sa uložiť súbory pre '{concept}'.")
-
-    elif not worker_output and state.get("error"):
-         # Error already logged by worker
-         pass # Just move to the next game
-    else:
-        log_messages.append(f"🤔 Preskakujem ukladanie pre hru index {current_index} (žiadny výstup alebo neplatný stav).")
-
-
-    # Increment index for the next iteration
-    next_index = current_index + 1
-    return {**state, "saved_games": saved_games, "current_game_index": next_index, "log_messages": log_messages, "worker_output": None} # Clear worker output
-
-# --- Conditional Edge ---
-def should_continue(state: AgentState) -> str:
-    """Determines whether to continue the loop or end."""
-    current_index = state.get("current_game_index", 0)
-    game_plan = state.get("game_plan", [])
-    error = state.get("error")
-
-    # Stop if major error occurred before worker loop
-    if not game_plan and error:
-        return "end_process"
-
-    if current_index >= len(game_plan) or current_index >= MAX_GAMES:
-        return "end_process"
-    else:
-        return "continue_worker"
-
-# --- Build the Graph ---
-graph_builder = StateGraph(AgentState)
-
-graph_builder.add_node("games_planner", games_planner_node)
-graph_builder.add_node("profesor_planner", profesor_planner_node)
-graph_builder.add_node("worker", worker_node)
-graph_builder.add_node("save_and_log", save_and_log_node)
-
-graph_builder.set_entry_point("games_planner")
-graph_builder.add_edge("games_planner", "profesor_planner")
-
-# Conditional loop for worker
-graph_builder.add_conditional_edges(
-    "profesor_planner",
-    should_continue,
-    {
-        "continue_worker": "worker", # Start worker loop if plan exists
-        "end_process": END
-    }
-)
-graph_builder.add_conditional_edges(
-    "save_and_log", # After saving/logging, check if loop should continue
-    should_continue,
-    {
-        "continue_worker": "worker", # Go back to worker for next game
-        "end_process": END
-    }
-)
-graph_builder.add_edge("worker", "save_and_log")
-
-# Compile the graph
-# memory = MemorySaver() # Optional: For resuming runs later
-app_graph = graph_builder.compile() # checkpointer=memory
+app_graph = get_app_graph()
+job_queue = get_job_queue()
+llm_cache = get_llm_cache()
+games_server = get_game_server()
+games_url = game_server.base_url(games_server) if games_server else None
+
+def format_time(timestamp: Optional[float]) -> str:
+    return time.strftime("%d.%m. %H:%M:%S", time.localtime(timestamp)) if timestamp else ""
+
+def run_state(run_id: str) -> Dict:
+    """Last checkpointed state of a job's run (saved games and their checks, also while it is running)."""
+    return app_graph.get_state({"configurable": {"thread_id": run_id}}).values or {}
+
+def show_games(job: Dict, saved_games: List[Dict], game_validation: Dict) -> None:
+    """Showcase of one job's games with check badges, links to the game server and packing."""
+    st.subheader("🎮 Vygenerované Hry")
+    if not saved_games:
+        st.info("Zatiaľ neboli vygenerované žiadne hry.")
+        return
+    for game_info in saved_games:
+        game_name = game_info.get("name", "Neznáma hra")
+        game_folder = game_info.get("folder", "")
+        if game_folder:
+            folder_path = Path(game_folder)
+            folder_url = quote(folder_key(WORKSPACE_DIR, folder_path)) # <theme>/<game>, "/" stays unescaped
+            validation = game_validation.get(game_folder)
+            badge = "" if validation is None else ("🔧 " if validation.get("repaired") else "✅ " if validation["ok"] else "⏳ " if validation["ok"] is None else "⚠️ ")
+            st.markdown(f"- {badge}**{game_name}** (v priečinku: `{folder_path.name}`)")
+            if validation and (validation["errors"] or validation["warnings"]):
+                with st.expander("Výsledok kontroly"):
+                    st.text("\n".join(validation["errors"] + validation["warnings"]))
+            index_file = folder_path / "index.html"
+            if index_file.exists() and games_url:
+                 # Served by game_server: precompressed, cacheable, works from any browser that reaches the host
+                 st.link_button(f"Otvoriť {game_name}", f"{games_url}/{folder_url}/index.html", help=f"Otvorí {index_file.name} cez lokálny server hier")
+
+    # Packed on request only; tar keeps hardlinked duplicate files once
+    col_format, col_pack = st.columns([1, 2])
+    archive_format = col_format.selectbox("Formát archívu", ("zip", "tar.gz", "tar.xz"), label_visibility="collapsed")
+    if col_pack.button("📦 Zabaliť hry do archívu", disabled=job["status"] == "running"):
+        st.session_state.run_archive = archive_run(job["run_id"], saved_games, archive_format)
+    run_archive = st.session_state.get("run_archive")
+    if run_archive and Path(run_archive).exists() and Path(run_archive).name.startswith(job["run_id"]):
+        with open(run_archive, "rb") as archive_file:
+            st.download_button(f"⬇️ Stiahnuť {Path(run_archive).name}", archive_file, file_name=Path(run_archive).name)
 
 # --- Streamlit UI ---
 st.title("🤖 AI Generátor Hier (Multi-Agent)")
-st.markdown("Zadajte tému a AI agenti vygenerujú sériu jednoduchých webových hier.")
+st.markdown("Zadajte témy (jednu na riadok); úlohy sa zaradia do fronty a hry pre ne vygenerujú worker procesy na pozadí.")
 
 # --- Input Area ---
-theme_input = st.text_input("Zadajte tému pre hry:", placeholder="napr. zvieratá, vesmír, matematika")
-
-if 'log_messages' not in st.session_state:
-    st.session_state.log_messages = ["Vitajte! Zadajte tému a stlačte 'Generovať Hry'."]
-if 'running' not in st.session_state:
-    st.session_state.running = False
-if 'saved_games_list' not in st.session_state:
-     st.session_state.saved_games_list = []
+themes_input = st.text_area("Témy pre hry:", placeholder="napr.\nzvieratá\nvesmír\nmatematika", height=110)
+concurrency_input = st.sidebar.number_input("Počet paralelných workerov", min_value=1, max_value=MAX_GAMES,
+                                            value=max(1, min(MAX_CONCURRENT_WORKERS, MAX_GAMES)),
+                                            help="Hry jednej témy generované naraz; 1 = postupne jedna po druhej.")
+batch_size_input = st.sidebar.number_input("Hier v jednom LLM volaní", min_value=1, max_value=8, value=max(1, min(WORKER_BATCH_SIZE, 8)),
+                                           help="Viac hier v jednej požiadavke šetrí požiadavky (limit 429) a opakované tokeny promptu; "
+                                                "chýbajúce alebo poškodené hry sa dogenerujú samostatne.")
+reuse_input = st.sidebar.checkbox("Znovu použiť nezmenené hry", value=REUSE_UNCHANGED_GAMES,
+                                  help="Hry s rovnakým promptom a modelom ako v predošlom behu sa nepregenerujú (podľa manifestu v pracovnom priestore). "
+                                       "Vypnuté pregeneruje všetky hry bez odpovedí z LLM cache.")
+priority_input = st.sidebar.number_input("Priorita", min_value=-10, max_value=10, value=0,
+                                         help="Úlohy s vyššou prioritou sa spracujú skôr.")
+
+# --- Selected job (survives reruns and browser refreshes via the URL) ---
+if 'job_id' not in st.session_state:
+    job_param = st.query_params.get("job")
+    st.session_state.job_id = int(job_param) if job_param and job_param.isdigit() else None
+
+# --- Worker processes ---
+workers = job_queue.workers()
+st.sidebar.subheader("🏭 Worker procesy")
+if workers:
+    busy = sum(1 for worker in workers if worker["job_id"] is not None)
+    st.sidebar.caption(f"Aktívne: {len(workers)} (pracuje {busy}), spoločný limit {GEMINI_RPM:g} požiadaviek/min.")
+else:
+    st.sidebar.warning("Nebeží žiadny worker, úlohy budú čakať vo fronte. Spustite `python -m job_worker` alebo:")
+    processes_input = st.sidebar.number_input("Počet procesov", min_value=1, max_value=8, value=2)
+    # Workers register only after building the graph; do not start a second pool meanwhile
+    if st.sidebar.button("▶️ Spustiť workerov", disabled=st.session_state.get("workers_started_at", 0) > time.time() - 30):
+        job_worker.launch_detached(int(processes_input))
+        st.session_state.workers_started_at = time.time()
+        st.sidebar.caption(f"Výstup workerov: `{job_worker.JOB_WORKER_LOG}`")
 
 # --- Control Button ---
-if st.button("🚀 Generovať 16 Hier", disabled=st.session_state.running or not theme_input):
-    # Clear previous run logs and saved games list for UI
-    st.session_state.log_messages = [f"🏁 Štartujem generovanie pre tému: '{theme_input}'"]
-    st.session_state.saved_games_list = []
-    st.session_state.running = True
-
-    # Clean workspace before starting? Optional.
-    # try:
-    #     for item in WORKSPACE_DIR.iterdir():
-    #         if item.is_dir():
-    #             shutil.rmtree(item)
-    #         else:
-    #             item.unlink()
-    #     st.session_state.log_messages.append("🧹 Pracovný priestor vyčistený.")
-    # except Exception as e:
-    #     st.session_state.log_messages.append(f"⚠️ Nepodarilo sa vyčistiť pracovný priestor: {e}")
+themes = [line.strip() for line in themes_input.splitlines() if line.strip() and not line.strip().startswith("#")]
+if st.button(f"📥 Zaradiť do fronty ({len(themes)})", disabled=not themes):
+    job_ids = [job_queue.submit(theme, int(priority_input), concurrency=int(concurrency_input),
+                                batch_size=int(batch_size_input), reuse_existing=reuse_input) for theme in themes]
+    st.session_state.job_id = job_ids[0]
+    st.query_params["job"] = str(job_ids[0])
+    st.toast(f"Zaradených {len(job_ids)} úloh.")
+
+# --- Run metrics of the selected job (written when its run ends) ---
+selected_job = job_queue.get(st.session_state.job_id) if st.session_state.job_id else None
+run_report = metrics.load_report(selected_job["run_id"]) if selected_job else None
+if run_report:
+    llm_totals = run_report["llm"]
+    st.sidebar.subheader("📊 Metriky behu")
+    st.sidebar.caption(f"ID behu: `{selected_job['run_id']}`")
+    col_a, col_b = st.sidebar.columns(2)
+    col_a.metric("Čas behu", f"{run_report['wall_s']:.0f} s")
+    col_b.metric("LLM volania", llm_totals["calls"], help=f"z cache: {llm_totals['cache_hits']}, opakovania: {llm_totals['retries']}")
+    col_a.metric("Tokeny (vstup/výstup)", f"{llm_totals['prompt_tokens'] // 1000}k / {llm_totals['output_tokens'] // 1000}k")
+    col_b.metric("Odhad ceny", f"${llm_totals['cost_usd']:.2f}")
+    if run_report.get("manifest", {}).get("llm_calls_saved"):
+        st.sidebar.caption(f"♻️ Manifest ušetril {run_report['manifest']['llm_calls_saved']} LLM volaní (nezmenené hry).")
+    batching = run_report.get("batching", {})
+    if batching.get("batch_calls"):
+        st.sidebar.caption(f"📦 Dávky: {batching['requests']} požiadaviek namiesto {batching['per_game_requests']}, "
+                           f"~{batching['prompt_tokens_est'] // 1000}k namiesto ~{batching['per_game_prompt_tokens_est'] // 1000}k tokenov promptu "
+                           f"({batching['fallback_calls']} hier dogenerovaných samostatne).")
+    hedging = run_report.get("hedging", {})
+    if hedging.get("hedged_calls") or hedging.get("timeouts"):
+        st.sidebar.caption(f"🏁 Záložné požiadavky: {hedging['hedged_calls']} (rýchlejšie {hedging['hedge_wins']}×), "
+                           f"ušetrené ~{hedging['latency_saved_s']:.1f} s za ~${hedging['extra_cost_usd_est']:.2f}; "
+                           f"vypršané volania: {hedging['timeouts']}.")
+    checks = run_report.get("validation", {})
+    if checks.get("checked"):
+        unchecked = checks.get("unchecked", 0) # Older reports do not have it
+        st.sidebar.caption(f"🧪 Kontrola hier: {checks['checked'] - checks['failed'] - unchecked}/{checks['checked']} v poriadku, "
+                           f"opravené {checks['repaired']}, stále chybné {checks['still_failing']}"
+                           + (f", neskontrolované {unchecked}." if unchecked else "."))
+    if llm_cache.enabled:
+        st.sidebar.caption(f"🗄️ LLM cache v tomto behu: {llm_totals['cache_hits']} zásahov / "
+                           f"{llm_totals['calls'] - llm_totals['cache_hits']} miss.")
+    if llm_totals.get("json_repairs"): # Older reports do not have it
+        st.sidebar.caption(f"🩹 Opravy JSON ({llm_totals['json_repaired_calls']} odpovedí): "
+                           + ", ".join(f"{rule} {count}×" for rule, count in llm_totals["json_repairs"].items()))
+    st.sidebar.caption(f"LLM latencia p50 {llm_totals['latency']['p50_s']:.1f} s, p90 {llm_totals['latency']['p90_s']:.1f} s")
+    if run_report["slowest_games"]:
+        st.sidebar.caption("Najpomalšie hry:")
+        st.sidebar.dataframe(
+            [{"hra": g["name"] or f"#{g['game_index'] + 1}", "čas [s]": round(g["seconds"], 1),
+              "tokeny": g["prompt_tokens"] + g["output_tokens"], "opakovania": g["retries"]}
+             for g in run_report["slowest_games"]],
+            hide_index=True,
+        )
 
-    # Initial state for the graph
-    initial_state = AgentState(
-        theme=theme_input,
-        game_concepts=None,
-        game_plan=None,
-        current_game_index=0,
-        worker_output=None,
-        saved_games=[],
-        log_messages=st.session_state.log_messages,
-        error=None
+# --- Job list and the selected job; while jobs are active only this fragment reruns, every DASHBOARD_REFRESH_S ---
+counts = job_queue.counts()
+jobs_active = bool(counts["queued"] or counts["running"])
+
+@st.fragment(run_every=DASHBOARD_REFRESH_S if jobs_active else None)
+def jobs_panel() -> None:
+    counts = job_queue.counts()
+    if jobs_active and not (counts["queued"] or counts["running"]):
+        st.rerun() # Last job finished: refresh the whole page (metrics, workers) and stop polling
+    st.subheader("📋 Fronta úloh")
+    for col, (status_name, label) in zip(st.columns(len(STATUS_LABELS)), STATUS_LABELS.items()):
+        col.metric(label, counts[status_name])
+    jobs = job_queue.list(limit=50)
+    if not jobs:
+        st.info("Fronta je prázdna. Zadajte témy a stlačte 'Zaradiť do fronty'.")
+        return
+    st.dataframe(
+        [{"#": job["id"], "téma": job["theme"], "stav": STATUS_LABELS[job["status"]], "priorita": job["priority"],
+          "pokusy": job["attempts"], "zaradená": format_time(job["created_at"]), "skončila": format_time(job["finished_at"]),
+          "chyba": job["error"] or ""} for job in jobs],
+        hide_index=True, height=min(35 * (len(jobs) + 1) + 3, 300),
     )
 
-    # Use st.status for better progress indication
-    with st.status("⚙️ Spúšťam agentov...", expanded=True) as status:
-        try:
-            # Stream the graph execution
-            # config = {"configurable": {"thread_id": "game-gen-thread"}} # For memory saver
-            final_state = None
-            for output in app_graph.stream(initial_state): # Removed config for simplicity
-                # output is a dictionary where keys are node names
-                # and values are the AgentState after that node ran
-                node_name = list(output.keys())[0]
-                current_state = list(output.values())[0]
-
-                # Update logs in session state for UI refresh
-                st.session_state.log_messages = current_state.get("log_messages", [])
-                st.session_state.saved_games_list = current_state.get("saved_games", [])
-
-                # Update status message (optional)
-                last_log = st.session_state.log_messages[-1] if st.session_state.log_messages else "Pracujem..."
-                status.update(label=f"⚙️ {last_log}", state="running")
-
-                # Store the very last state
-                final_state = current_state
-
-            # Update status upon completion
-            if final_state and final_state.get("error"):
-                 status.update(label=f"⚠️ Proces dokončený s chybami.", state="error")
-            else:
-                 status.update(label="✅ Proces generovania hier dokončený!", state="complete")
-
-        except Exception as e:
-            st.error(f"🔴 Neočakávaná chyba počas behu grafu: {e}")
-            status.update(label=f"💥 Kritická chyba!", state="error")
-            st.session_state.log_messages.append(f"💥 Kritická chyba: {e}")
-        finally:
-            st.session_state.running = False # Allow starting again
-            # Rerun to potentially update the showcase if it's on the same page
-            # Or rely on user navigating to the showcase page
-            st.rerun()
-
-
-# --- Log Display ---
-st.subheader("📜 Priebeh Generovania (Log)")
-log_container = st.container(height=300)
-with log_container:
-    log_text = "\n".join(st.session_state.log_messages)
-    st.text(log_text)
-
-# --- Showcase Area (Simple List for now) ---
-st.subheader("🎮 Vygenerované Hry")
-if st.session_state.saved_games_list:
-    for game_info in st.session_state.saved_games_list:
-        game_name = game_info.get("name", "Neznáma hra")
-        game_folder = game_info.get("folder", "")
-        if game_folder:
-            folder_path = Path(game_folder)
-            st.markdown(f"- **{game_name}** (v priečinku: `{folder_path.name}`)")
-            # Add a link - Note: This link only works reliably if running locally
-            # and potentially requires the local server to be running if JS needs it.
-            index_file = folder_path / "index.html"
-            if index_file.exists():
-                 # Simple relative link - might not work well in all scenarios
-                 # A better approach might involve the local server if kept
-                 st.link_button(f"Otvoriť {game_name}", f"./{folder_path.relative_to(Path.cwd())}/index.html", help=f"Pokúsi sa otvoriť {index_file.name}")
-
+    themes_by_id = {job["id"]: job["theme"] for job in jobs}
+    job_ids = list(themes_by_id)
+    if st.session_state.job_id and st.session_state.job_id not in themes_by_id:
+        job_ids.insert(0, st.session_state.job_id) # Older job opened via the URL
+    job_id = st.selectbox("Detail úlohy", job_ids, index=job_ids.index(st.session_state.job_id) if st.session_state.job_id in job_ids else 0,
+                          format_func=lambda i: f"#{i} {themes_by_id.get(i, '')}")
+    if job_id != st.session_state.job_id:
+        st.session_state.job_id = job_id
+        st.query_params["job"] = str(job_id)
+        st.rerun() # Sidebar metrics belong to the selected job
+    job = job_queue.get(job_id)
+    if job is None:
+        return
+
+    st.markdown(f"**#{job['id']} {job['theme']}** – {STATUS_LABELS[job['status']]}"
+                + (f" (worker `{job['worker']}`, pokus {job['attempts']})" if job["status"] == "running" else ""))
+    if job["error"]:
+        st.error(f"🔴 {job['error']}")
+    col_cancel, col_retry = st.columns(2)
+    if job["status"] == "queued" and col_cancel.button("🛑 Zrušiť úlohu"):
+        job_queue.cancel(job["id"])
+        st.rerun()
+    if job["status"] in ("failed", "cancelled") and col_retry.button("🔁 Znova zaradiť",
+                                                                      help="Spustí úlohu znova ako nový beh; hotové nezmenené hry sa použijú bez volania LLM, dogenerujú sa len chýbajúce a chybné."):
+        job_queue.retry(job["id"])
+        st.rerun()
+
+    # --- Log Display ---
+    st.subheader("📜 Priebeh Generovania (Log)")
+    log_view = st.session_state.get("log_view")
+    if log_view is None or log_view["run_id"] != job["run_id"]: # Another job (or its retry) starts from the file's tail
+        log_view = st.session_state.log_view = {"run_id": job["run_id"], "seq": 0, "offset": 0,
+                                                "lines": deque(maxlen=event_log.EVENT_LOG_CAPACITY)}
+    # Each poll reads only what the worker appended since the last one
+    events, log_view["offset"] = event_log.read_events(job["run_id"], log_view["seq"], log_view["offset"])
+    if events:
+        log_view["seq"] = events[-1].seq
+        log_view["lines"].extend(event.format() for event in events)
+    with st.container(height=300):
+        st.text("\n".join(log_view["lines"]) if log_view["lines"] else "Úloha zatiaľ nezačala.")
+    st.caption(f"Celý log: `{event_log.log_path(job['run_id'])}`")
+
+    state = run_state(job["run_id"])
+    saved_games = state.get("saved_games") or (job["result"] or {}).get("saved_games", [])
+    show_games(job, saved_games, state.get("validation") or {})
+
+jobs_panel()
+
+# --- Catalog of every generated game (all runs and worker processes), searched and paged in SQLite ---
+st.subheader("🗂️ Katalóg hier")
+catalog = get_catalog()
+col_query, col_status, col_page = st.columns([3, 1, 1])
+catalog_query = col_query.text_input("Hľadať v katalógu", placeholder="názov hry, téma alebo inštrukcia", label_visibility="collapsed")
+catalog_status = col_status.selectbox("Kontrola", list(VALIDATION_LABELS), format_func=VALIDATION_LABELS.get, label_visibility="collapsed")
+catalog_total = catalog.count(catalog_query, catalog_status)
+catalog_pages = max(1, -(-catalog_total // CATALOG_PAGE_SIZE))
+catalog_page = min(int(col_page.number_input("Strana", min_value=1, value=1, label_visibility="collapsed")), catalog_pages)
+catalog_games = catalog.search(catalog_query, catalog_status, CATALOG_PAGE_SIZE, (catalog_page - 1) * CATALOG_PAGE_SIZE)
+if catalog_games:
+    st.caption(f"{catalog_total} hier, strana {catalog_page}/{catalog_pages}")
+    st.dataframe(
+        [{"kontrola": VALIDATION_LABELS[game["validation"]].split()[0] if game["validation"] else "",
+          "hra": game["concept"], "téma": game["theme"], "súbory": game["file_count"], "veľkosť [kB]": round(game["bytes"] / 1024, 1),
+          "vygenerovaná": format_time(game["generated_at"]), "model": game["model"] or "",
+          "chyby": "; ".join(game["validation_errors"][:2]),
+          "hra online": f"{games_url}/{quote(game['folder'])}/index.html" if games_url else None}
+         for game in catalog_games],
+        column_config={"hra online": st.column_config.LinkColumn(display_text="Otvoriť")},
+        hide_index=True,
+    )
+elif catalog_query or catalog_status is not None:
+    st.info("Žiadna hra nezodpovedá hľadaniu.")
 else:
-    st.info("Zatiaľ neboli vygenerované žiadne hry.")
+    st.info("Katalóg je prázdny.")
+    # Games generated before the catalog existed are only on disk
+    if st.button("🔎 Doplniť hry z pracovného priestoru", help="Zaradí do katalógu priečinky hier, ktoré v ňom chýbajú (bez témy)."):
+        st.toast(f"Doplnených {catalog.rebuild(WORKSPACE_DIR, get_manifest().games)} hier.")
+        st.rerun()
 
 
 # --- Footer / Warnings ---
+if llm_cache.enabled:
+    cache_stats = llm_cache.stats()
+    st.sidebar.caption(f"LLM cache (`{llm_cache.mode}`): {cache_stats['entries']} záznamov, {cache_stats['bytes'] / 1024 / 1024:.1f} MB")
 st.sidebar.markdown("---")
 st.sidebar.warning("""
     **Obmedzenia prototypu a varovania:**
     - **Generovanie:** Môže trvať dlho a spotrebovať veľa API volaní.
     - **Kvalita Hier:** Vizuálna stránka a funkčnosť závisí od schopností LLM.
     - **Bezpečnosť:** AI generuje kód. Spúšťajte lokálne a opatrne.
-    - **Stav:** Stratí sa pri obnovení prehliadača.
+    - **Stav:** Úlohy sa ukladajú vo fronte a beh po každom kroku; prerušená úloha pokračuje od posledného checkpointu.
 """, icon="⚠️")
@@ -0,0 +1,146 @@
+# batch_runner.py - Headless batch generation: python -m batch_runner themes.txt --output summary.json
+import time
+
+_STARTED_AT = time.perf_counter()
+
+import argparse
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import event_log
+import game_pipeline
+import metrics
+
+_IMPORTED_AT = time.perf_counter()
+
+
+def read_themes(path: Path) -> List[str]:
+    """One theme per line; blank lines and lines starting with '#' are ignored."""
+    themes = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            themes.append(line)
+    return themes
+
+
+def run_theme(graph, theme: str, run_id: str, concurrency: int, resume: bool = False, reuse_existing: bool = True,
+              archive_format: Optional[str] = None, batch_size: int = game_pipeline.WORKER_BATCH_SIZE) -> Dict:
+    """Runs (or resumes) the whole pipeline for one theme and returns its summary entry."""
+    config = game_pipeline.run_config(run_id, concurrency)
+    started = time.perf_counter()
+    graph_input = game_pipeline.make_initial_state(theme, concurrency, reuse_existing=reuse_existing, batch_size=batch_size)
+    final_state = None
+    already_finished = False
+    if resume:
+        snapshot = graph.get_state(config)
+        if snapshot.next:
+            graph_input = None # Continue from the last checkpoint
+        elif snapshot.values:
+            final_state = snapshot.values # Finished in an earlier invocation of this batch
+            already_finished = True
+    error = None
+    run_metrics = metrics.start_run(run_id, game_pipeline.model_name)
+    run_log = event_log.start_log(run_id)
+    try:
+        if final_state is None:
+            final_state = graph.invoke(graph_input, config=config)
+    except Exception as e:
+        logging.exception("Beh pre tému '%s' zlyhal", theme)
+        final_state = graph.get_state(config).values if graph.checkpointer else {}
+        error = str(e)
+    finally:
+        run_log.close()
+    saved_games = final_state.get("saved_games", [])
+    # A run that already finished executed nothing now; keep the report of the invocation that did the work
+    report = (metrics.load_report(run_id) if already_finished else None) or run_metrics.write()
+    archive = game_pipeline.archive_run(run_id, saved_games, archive_format) if archive_format and saved_games else None
+    return {
+        "theme": theme,
+        "run_id": run_id,
+        "games_planned": len(final_state.get("game_plan") or []),
+        "games_saved": len(saved_games),
+        "saved_games": saved_games,
+        "error": error or final_state.get("error"),
+        "seconds": round(time.perf_counter() - started, 3),
+        "log_file": str(run_log.path),
+        "archive": str(archive) if archive else None,
+        "llm": {**{key: report["llm"][key] for key in ("calls", "cache_hits", "retries", "prompt_tokens", "output_tokens", "cost_usd")},
+                "calls_saved": report["manifest"]["llm_calls_saved"]},
+        "batching": report["batching"],
+        "hedging": report["hedging"],
+        "validation": report["validation"],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m batch_runner", description="Generuje hry pre viacero tém bez Streamlit UI.")
+    parser.add_argument("themes_file", type=Path, nargs="?", help="Súbor s témami, jedna téma na riadok.")
+    parser.add_argument("-o", "--output", type=Path, default=Path("batch_summary.json"), help="Kam zapísať JSON súhrn.")
+    parser.add_argument("-c", "--concurrency", type=int, default=game_pipeline.MAX_CONCURRENT_WORKERS, help="Počet hier generovaných naraz.")
+    parser.add_argument("--batch-id", default=None, help="ID dávky; s rovnakým ID a --resume pokračuje prerušená dávka.")
+    parser.add_argument("--resume", action="store_true", help="Pokračuje v nedokončených behoch danej dávky z checkpointov.")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Nezapisuje checkpointy (rýchlejšie, bez možnosti pokračovania).")
+    parser.add_argument("-b", "--batch-size", type=int, default=game_pipeline.WORKER_BATCH_SIZE, help="Počet hier v jednom LLM volaní.")
+    parser.add_argument("--regenerate", action="store_true", help="Pregeneruje aj hry, ktoré sa podľa manifestu nezmenili, bez odpovedí z LLM cache.")
+    parser.add_argument("--archive", choices=("zip", "tar", "tar.gz", "tar.xz"), default=None,
+                        help="Zabalí hry každého behu do ARCHIVE_DIR/<run_id>.<formát>.")
+    parser.add_argument("--startup-only", action="store_true", help="Iba zmeria čas importu a zostavenia grafu a skončí.")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    if not args.startup_only and not args.themes_file:
+        parser.error("chýba themes_file")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+
+    graph_started = time.perf_counter()
+    graph = game_pipeline.build_graph(checkpointer=None if args.no_checkpoint else game_pipeline.open_checkpointer())
+    startup = {
+        "import_s": round(_IMPORTED_AT - _STARTED_AT, 4),
+        "graph_build_s": round(time.perf_counter() - graph_started, 4),
+    }
+    if args.startup_only:
+        print(json.dumps(startup))
+        return 0
+
+    themes = read_themes(args.themes_file)
+    batch_id = args.batch_id or datetime.now(timezone.utc).strftime("batch-%Y%m%d-%H%M%S")
+    results = []
+    for i, theme in enumerate(themes):
+        print(f"[{i + 1}/{len(themes)}] {theme}", file=sys.stderr)
+        results.append(run_theme(graph, theme, f"{batch_id}-{i:03d}", args.concurrency,
+                                 resume=args.resume and not args.no_checkpoint, reuse_existing=not args.regenerate,
+                                 archive_format=args.archive, batch_size=args.batch_size))
+
+    summary = {
+        "batch_id": batch_id,
+        "model": game_pipeline.model_name,
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "startup": startup,
+        "totals": {
+            "themes": len(results),
+            "themes_failed": sum(1 for r in results if r["error"]),
+            "games_saved": sum(r["games_saved"] for r in results),
+            "seconds": round(sum(r["seconds"] for r in results), 3),
+            "llm_calls": sum(r["llm"]["calls"] for r in results),
+            "llm_calls_saved": sum(r["llm"]["calls_saved"] for r in results),
+            "prompt_tokens": sum(r["llm"]["prompt_tokens"] for r in results),
+            "output_tokens": sum(r["llm"]["output_tokens"] for r in results),
+            "cost_usd": round(sum(r["llm"]["cost_usd"] for r in results), 4),
+            "hedge_extra_cost_usd_est": round(sum(r["hedging"]["extra_cost_usd_est"] for r in results), 4),
+            "hedge_latency_saved_s": round(sum(r["hedging"]["latency_saved_s"] for r in results), 3),
+            "games_invalid": sum(r["validation"]["still_failing"] for r in results),
+        },
+        "runs": results,
+    }
+    args.output.write_text(json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Súhrn zapísaný do {args.output}", file=sys.stderr)
+    return 1 if summary["totals"]["themes_failed"] == len(results) and results else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# benchmarks - Offline performance suites (run with python -m benchmarks.<name>)
@@ -0,0 +1,196 @@
+# benchmarks/bench_pipeline.py - Offline end-to-end benchmark of the game pipeline on the simulated Gemini backend
+"""
+Usage:
+    python -m benchmarks.bench_pipeline                                  # 16, 100 and 1000 games
+    python -m benchmarks.bench_pipeline --games 16 100 --concurrency 8 --latency lognormal:0.2,0.5
+    python -m benchmarks.bench_pipeline --compare benchmarks/results/<older>.json
+    python -m benchmarks.bench_pipeline --games 100 --batch-size 4                # batched worker calls
+    python -m benchmarks.bench_pipeline --games 100 --hedge --latency lognormal:0.1,1.0 # hedged requests on a heavy tail
+
+Every scenario runs the compiled graph end to end against FakeGeminiModel in a temporary
+workspace and records games per minute, per-node latency percentiles, game write I/O time
+and peak memory. Results are written as JSON to benchmarks/results/ so runs of different
+versions can be compared with --compare.
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+IO_FUNCTIONS = ("save_game_files", "stage_game_file", "commit_game") # Streaming uses the last two directly
+
+
+class Timings:
+    """Thread-safe collection of durations per label."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values: Dict[str, List[float]] = {}
+
+    def add(self, label: str, seconds: float) -> None:
+        with self._lock:
+            self.values.setdefault(label, []).append(seconds)
+
+    def timed(self, label: str, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(label, time.perf_counter() - started)
+        return wrapper
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_scenario(pipeline, games: int, args) -> Dict:
+    """Runs one end-to-end generation of `games` games and returns its measurements."""
+    from llm_backends import FakeGeminiModel
+    import metrics
+
+    model = FakeGeminiModel(latency=args.latency, rate_limit_rate=args.rate_limit_rate,
+                            malformed_rate=args.malformed_rate, payload_bytes=args.payload_bytes, seed=args.seed)
+    pipeline.set_model(model)
+    io_timings = Timings()
+    originals = {name: getattr(pipeline, name) for name in IO_FUNCTIONS}
+    for name, fn in originals.items():
+        setattr(pipeline, name, io_timings.timed(name, fn))
+    pipeline.MAX_GAMES = games
+    graph = pipeline.build_graph()
+    run_metrics = metrics.start_run(f"bench-{games}", "fake")
+
+    with tempfile.TemporaryDirectory(prefix="bench_workspace_") as workspace:
+        pipeline.WORKSPACE_DIR = Path(workspace)
+        if args.tracemalloc:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            final_state = graph.invoke(pipeline.make_initial_state("benchmark", args.concurrency, batch_size=args.batch_size),
+                                       config=pipeline.run_config(f"bench-{games}", args.concurrency))
+        finally:
+            elapsed = time.perf_counter() - started
+            peak_traced = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+            if args.tracemalloc:
+                tracemalloc.stop()
+            for name, fn in originals.items():
+                setattr(pipeline, name, fn)
+            blob_stats = pipeline.get_blob_store().stats()
+
+    saved = len(final_state.get("saved_games", []))
+    report = run_metrics.report()
+    return {
+        "games_requested": games,
+        "games_saved": saved,
+        "wall_s": round(elapsed, 4),
+        "games_per_minute": round(saved / elapsed * 60, 2) if elapsed else 0.0,
+        "llm_calls": model.calls,
+        "injected_429": model.injected_429,
+        "injected_malformed": model.injected_malformed,
+        "nodes": report["nodes"],
+        "batching": report["batching"],
+        "hedging": report["hedging"],
+        "validation": report["validation"],
+        "llm": {key: value for key, value in report["llm"].items() if key != "cost_usd"},
+        "io": {name: metrics.summarize(io_timings.values.get(name, [])) for name in IO_FUNCTIONS},
+        "blob_store": blob_stats,
+        "peak_traced_mb": round(peak_traced / 1024 / 1024, 2) if peak_traced is not None else None,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2), # Process-wide high-water mark
+    }
+
+
+def compare(current: Dict, baseline_path: Path) -> None:
+    """Prints relative changes of the headline numbers against an older result file."""
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    old = {s["games_requested"]: s for s in baseline["scenarios"]}
+    print(f"\nPorovnanie s {baseline_path.name} ({baseline.get('git_revision')}):")
+    for scenario in current["scenarios"]:
+        before = old.get(scenario["games_requested"])
+        if not before:
+            continue
+        for key in ("games_per_minute", "wall_s", "peak_traced_mb"):
+            if before.get(key) and scenario.get(key) is not None:
+                change = (scenario[key] - before[key]) / before[key] * 100
+                print(f"  {scenario['games_requested']:>5} hier  {key:<18} {before[key]:>10} -> {scenario[key]:>10} ({change:+.1f} %)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_pipeline", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, nargs="+", default=[16, 100, 1000])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=1, help="Hier v jednom LLM volaní (1 = režim po jednej hre).")
+    parser.add_argument("--hedge", action="store_true", help="Zapne záložné požiadavky pre pomalé volania (LLM_HEDGE=1).")
+    parser.add_argument("--latency", default="lognormal:0.05,0.5", help="Rozdelenie latencie simulovaného modelu.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.02, help="Podiel volaní, ktoré vrátia 429.")
+    parser.add_argument("--malformed-rate", type=float, default=0.05, help="Podiel odpovedí s poškodeným JSON.")
+    parser.add_argument("--payload-bytes", type=int, default=6000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false", help="Vypne meranie pamäte (menšia réžia).")
+    parser.add_argument("--output", type=Path, default=None, help="Výstupný JSON (predvolene benchmarks/results/<čas>.json).")
+    parser.add_argument("--compare", type=Path, default=None, help="Starší výsledok na porovnanie.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Vypisuje varovania pipeline (429, opravy JSON...).")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.ERROR, format="%(levelname)s %(message)s")
+
+    # The simulated backend must never touch the real API, the response cache or the rate limits
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["LLM_CACHE_MODE"] = "off"
+    os.environ.setdefault("GEMINI_RPM", "1000000000")
+    os.environ.setdefault("GEMINI_TPM", "1000000000000")
+    os.environ.setdefault("LLM_HEDGE_BUDGET_PER_MIN", "1000000") # Simulated calls are far shorter than real ones
+    if args.hedge:
+        os.environ["LLM_HEDGE"] = "1"
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    import game_pipeline
+
+    result = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "pipeline": {"stream_worker_output": game_pipeline.STREAM_WORKER_OUTPUT, "workspace_dedup": game_pipeline.WORKSPACE_DEDUP,
+                     "llm_hedge": game_pipeline.LLM_HEDGE, "llm_timeout_s": game_pipeline.LLM_TIMEOUT_S,
+                     "validate_games": game_pipeline.VALIDATE_GAMES, "validation_workers": game_pipeline.GAME_VALIDATION_WORKERS},
+        "scenarios": [],
+    }
+    for games in args.games:
+        print(f"▶ {games} hier...", file=sys.stderr)
+        scenario = run_scenario(game_pipeline, games, args)
+        result["scenarios"].append(scenario)
+        print(f"  {scenario['games_saved']}/{games} hier za {scenario['wall_s']} s "
+              f"({scenario['games_per_minute']} hier/min), commit_game p50 {scenario['io']['commit_game']['p50_s']} s, "
+              f"deduplikované súbory {scenario['blob_store']['dedup_hits']}/{scenario['blob_store']['files_written']}",
+              file=sys.stderr)
+
+    output = args.output or RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{result['git_revision'] or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"Výsledky zapísané do {output}", file=sys.stderr)
+    if args.compare:
+        compare(result, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# event_log.py - Bounded, structured run log kept outside the graph state, mirrored to a rotating file
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Deque, List, Optional, Tuple
+
+from metrics import current_game
+
+LOG_DIR = Path(os.getenv("EVENT_LOG_DIR", ".logs"))
+EVENT_LOG_CAPACITY = int(os.getenv("EVENT_LOG_CAPACITY", "500")) # Events kept in memory per run
+EVENT_LOG_FILE_MAX_BYTES = int(os.getenv("EVENT_LOG_FILE_MAX_MB", "5")) * 1024 * 1024
+EVENT_LOG_FILE_BACKUPS = int(os.getenv("EVENT_LOG_FILE_BACKUPS", "3"))
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+logger = logging.getLogger("game_pipeline.events")
+
+
+@dataclass(frozen=True)
+class LogEvent:
+    seq: int # Monotonic per run; the UI uses it as a cursor
+    timestamp: float
+    level: str
+    message: str
+    game_index: Optional[int] = None # 0-based index in game_plan, None for run-level events
+
+    def format(self) -> str:
+        return f"{time.strftime('%H:%M:%S', time.localtime(self.timestamp))} {self.message}"
+
+
+class EventLog:
+    """Ring buffer of the newest events of one run; every event is also appended to <LOG_DIR>/<run_id>.log (JSON lines)."""
+
+    def __init__(self, run_id: str, capacity: int = EVENT_LOG_CAPACITY, directory: Optional[Path] = LOG_DIR):
+        self.run_id = run_id
+        self._events: Deque[LogEvent] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._file: Optional[RotatingFileHandler] = None
+        if directory is not None:
+            directory.mkdir(parents=True, exist_ok=True)
+            self.path = log_path(run_id, directory)
+            self._load_tail(directory)
+            self._file = RotatingFileHandler(self.path, maxBytes=EVENT_LOG_FILE_MAX_BYTES,
+                                             backupCount=EVENT_LOG_FILE_BACKUPS, encoding="utf-8", delay=True)
+            self._file.setFormatter(logging.Formatter("%(message)s"))
+
+    def emit(self, level: str, message: str, game_index: Optional[int] = None) -> LogEvent:
+        with self._lock:
+            self._seq += 1
+            event = LogEvent(self._seq, time.time(), level, message, game_index)
+            self._events.append(event)
+        if self._file is not None:
+            self._file.handle(logging.makeLogRecord({"msg": json.dumps(asdict(event), ensure_ascii=False),
+                                                     "levelname": level, "levelno": logging.getLevelName(level)}))
+        return event
+
+    def tail(self, count: Optional[int] = None) -> List[LogEvent]:
+        with self._lock:
+            events = list(self._events)
+        return events[-count:] if count else events
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+    def _load_tail(self, directory: Path) -> None:
+        """Restores the buffer (and the sequence counter) from an existing log file of this run."""
+        events, _ = read_events(self.run_id, directory=directory, capacity=self._events.maxlen)
+        self._events.extend(events)
+        self._seq = max((event.seq for event in events), default=0)
+
+
+def log_path(run_id: str, directory: Path = LOG_DIR) -> Path:
+    return directory / f"{run_id}.log"
+
+
+def read_events(run_id: str, after_seq: int = 0, offset: int = 0, directory: Path = LOG_DIR,
+                capacity: int = EVENT_LOG_CAPACITY) -> Tuple[List[LogEvent], int]:
+    """Read-only tail of a run's log file: events newer than `after_seq`, read from byte `offset` on.
+
+    Offset 0 starts roughly `capacity` events before the end. Returns at most `capacity` events (oldest first)
+    and the offset for the next call; creates no directory and opens no handler, so readers can poll it cheaply.
+    """
+    try:
+        f = log_path(run_id, directory).open("rb")
+    except FileNotFoundError:
+        return [], 0
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        if offset <= 0 or offset > size: # First read, or the file was rotated since the last one
+            offset = max(0, size - capacity * 1024) # Roughly enough bytes for a full buffer
+        f.seek(offset)
+        data = f.read()
+    complete = data.rfind(b"\n") + 1 # A line still being written is read on the next call
+    events = []
+    for line in data[:complete].decode("utf-8", errors="replace").splitlines():
+        try:
+            event = LogEvent(**json.loads(line))
+        except (ValueError, TypeError):
+            continue # First line may be cut in half by the seek
+        if event.seq > after_seq:
+            events.append(event)
+    return events[-capacity:], offset + complete
+
+
+# --- Current run's log, propagated to LangGraph worker threads through contextvars ---
+_current_log: ContextVar[Optional[EventLog]] = ContextVar("current_event_log", default=None)
+
+
+def start_log(run_id: str, **kwargs) -> EventLog:
+    """Opens the event log for the graph run executed by the calling thread."""
+    event_log = EventLog(run_id, **kwargs)
+    _current_log.set(event_log)
+    return event_log
+
+
+def log_event(level: str, message: str, game_index: Optional[int] = None) -> None:
+    """Records an event in the current run's log and forwards it to the standard logging module."""
+    if game_index is None:
+        game_index = current_game()
+    event_log = _current_log.get()
+    if event_log is not None:
+        event_log.emit(level, message, game_index)
+    logger.log(logging.getLevelName(level), message)
+
+
+def info(message: str, game_index: Optional[int] = None) -> None:
+    log_event("INFO", message, game_index)
+
+
+def warning(message: str, game_index: Optional[int] = None) -> None:
+    log_event("WARNING", message, game_index)
+
+
+def error(message: str, game_index: Optional[int] = None) -> None:
+    log_event("ERROR", message, game_index)
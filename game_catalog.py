@@ -0,0 +1,230 @@
+# game_catalog.py - Persistent, searchable index of every generated game across runs (SQLite + FTS5)
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from game_store import folder_key, is_precompressed_variant
+
+CATALOG_NAME = "catalog.sqlite3"
+VALIDATION_STATUSES = ("ok", "repaired", "failed") # NULL = not checked (VALIDATE_GAMES=0 or older games)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS games ("
+    " id INTEGER PRIMARY KEY, folder TEXT NOT NULL UNIQUE, path TEXT NOT NULL, theme TEXT NOT NULL DEFAULT '',"
+    " concept TEXT NOT NULL, instruction TEXT NOT NULL DEFAULT '', model TEXT, run_id TEXT, files TEXT NOT NULL DEFAULT '{}',"
+    " file_count INTEGER NOT NULL DEFAULT 0, bytes INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL,"
+    " generated_at REAL NOT NULL, updated_at REAL NOT NULL, validation TEXT, validation_errors TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_games_updated ON games(updated_at DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_games_validation ON games(validation, updated_at DESC)",
+)
+
+# External-content FTS index over the searchable columns, kept in sync by triggers;
+# remove_diacritics lets "vesmir" find "vesmír"
+_FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS games_fts USING fts5(concept, theme, instruction,"
+    " content='games', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS games_ai AFTER INSERT ON games BEGIN"
+    " INSERT INTO games_fts(rowid, concept, theme, instruction) VALUES (new.id, new.concept, new.theme, new.instruction); END",
+    "CREATE TRIGGER IF NOT EXISTS games_ad AFTER DELETE ON games BEGIN"
+    " INSERT INTO games_fts(games_fts, rowid, concept, theme, instruction) VALUES ('delete', old.id, old.concept, old.theme, old.instruction); END",
+    "CREATE TRIGGER IF NOT EXISTS games_au AFTER UPDATE OF concept, theme, instruction ON games BEGIN"
+    " INSERT INTO games_fts(games_fts, rowid, concept, theme, instruction) VALUES ('delete', old.id, old.concept, old.theme, old.instruction);"
+    " INSERT INTO games_fts(rowid, concept, theme, instruction) VALUES (new.id, new.concept, new.theme, new.instruction); END",
+)
+
+
+def game_file_sizes(game_dir: Path) -> Dict[str, int]:
+    """Sizes of the game's own files (without the precompressed .gz/.br variants)."""
+    return {path.relative_to(game_dir).as_posix(): path.stat().st_size for path in sorted(game_dir.rglob("*"))
+            if path.is_file() and not is_precompressed_variant(path)}
+
+
+def validation_status(result: Dict, repaired: bool = False) -> Optional[str]:
+    """Catalog status of a game_validation result; None (unchecked) when the check timed out."""
+    if result["ok"] is None:
+        return None
+    return "failed" if not result["ok"] else "repaired" if repaired else "ok"
+
+
+def _game_dirs(workspace_dir: Path) -> List[Path]:
+    """Folders with an index.html one or two levels below the workspace, skipping dot-folders (.blobs, .staging, ...)."""
+    found = []
+    for top in workspace_dir.iterdir():
+        if not top.is_dir() or top.name.startswith("."):
+            continue
+        if (top / "index.html").is_file():
+            found.append(top)
+            continue
+        found += [game_dir for game_dir in top.iterdir()
+                  if game_dir.is_dir() and not game_dir.name.startswith(".") and (game_dir / "index.html").is_file()]
+    return found
+
+
+def _row_to_game(row: sqlite3.Row) -> Dict:
+    game = dict(row)
+    game["files"] = json.loads(game["files"])
+    game["validation_errors"] = json.loads(game["validation_errors"]) if game["validation_errors"] else []
+    return game
+
+
+class GameCatalog:
+    """One row per game folder of a workspace: where it came from, what it contains and whether it passed the checks.
+
+    Rows are keyed by the workspace-relative folder ("<theme>/<game>"), like the manifest, so a
+    regenerated game replaces its row. The catalog file lives in the workspace unless workspace_dir says otherwise.
+    Search uses FTS5 when the SQLite build has it and falls back to LIKE otherwise; listing
+    is index-ordered by updated_at, so pages stay fast with tens of thousands of games.
+    """
+
+    def __init__(self, path: Path, workspace_dir: Optional[Path] = None):
+        self.path = path
+        self.workspace_dir = workspace_dir or path.parent
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        try:
+            for statement in _FTS_SCHEMA:
+                self._conn.execute(statement)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False # SQLite built without FTS5
+        self._conn.commit()
+
+    def record(self, game_dir: Path, theme: str, concept: str, instruction: str = "", run_id: Optional[str] = None,
+               model: Optional[str] = None) -> None:
+        """Adds or refreshes a saved game; created_at survives, the last validation only if the content is unchanged."""
+        files = game_file_sizes(game_dir)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO games (folder, path, theme, concept, instruction, model, run_id, files, file_count, bytes,"
+                " created_at, generated_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(folder) DO UPDATE SET path = excluded.path, theme = excluded.theme, concept = excluded.concept,"
+                " instruction = excluded.instruction, model = excluded.model, run_id = excluded.run_id, files = excluded.files,"
+                " file_count = excluded.file_count, bytes = excluded.bytes, generated_at = excluded.generated_at,"
+                " updated_at = excluded.updated_at, validation = CASE WHEN games.generated_at = excluded.generated_at"
+                " THEN games.validation END, validation_errors = CASE WHEN games.generated_at = excluded.generated_at"
+                " THEN games.validation_errors END", # New content invalidates the previous check result
+                (folder_key(self.workspace_dir, game_dir), str(game_dir), theme, concept, instruction, model, run_id,
+                 json.dumps(files), len(files), sum(files.values()), now, game_dir.stat().st_mtime, now), # Folder mtime: when the content was written, also for reused games
+            )
+            self._conn.commit()
+
+    def record_validation(self, results: Dict[str, Dict], repaired: bool = False) -> None:
+        """Stores game_validation results keyed by game folder path."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE games SET validation = ?, validation_errors = ? WHERE folder = ?",
+                [(validation_status(result, repaired), json.dumps(result["errors"], ensure_ascii=False),
+                  folder_key(self.workspace_dir, Path(folder)))
+                 for folder, result in results.items()])
+            self._conn.commit()
+
+    def forget(self, folder_name: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM games WHERE folder = ?", (folder_name,))
+            self._conn.commit()
+
+    def _where(self, query: str, status: Optional[str]) -> Tuple[str, str, List]:
+        """FROM/WHERE clause (and the FTS rank ordering) for a search; status "" selects unchecked games."""
+        tables, conditions, params, rank = "games", [], [], ""
+        terms = re.findall(r"\w+", query)
+        if terms and self.fts:
+            # CROSS JOIN keeps the FTS match as the outer loop; otherwise SQLite may walk the status index and probe FTS per row
+            tables = "games_fts CROSS JOIN games ON games.id = games_fts.rowid"
+            conditions.append("games_fts MATCH ?")
+            params.append(" ".join(f'"{term}"*' for term in terms)) # Every word, as a prefix
+            rank = "games_fts.rank, "
+        elif terms:
+            for term in terms:
+                conditions.append("(games.concept LIKE ? OR games.theme LIKE ? OR games.instruction LIKE ?)")
+                params += [f"%{term}%"] * 3
+        if status == "":
+            conditions.append("games.validation IS NULL")
+        elif status:
+            conditions.append("games.validation = ?")
+            params.append(status)
+        return f"FROM {tables}" + (f" WHERE {' AND '.join(conditions)}" if conditions else ""), rank, params
+
+    def search(self, query: str = "", status: Optional[str] = None, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """One page of games matching all words of `query`: best matches first, otherwise newest first."""
+        where, rank, params = self._where(query, status)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT games.* {where} ORDER BY {rank}games.updated_at DESC LIMIT ? OFFSET ?",
+                                      (*params, limit, offset)).fetchall()
+        return [_row_to_game(row) for row in rows]
+
+    def count(self, query: str = "", status: Optional[str] = None) -> int:
+        where, _, params = self._where(query, status)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) {where}", params).fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        """Number of games per validation status ("" = unchecked) and in total."""
+        with self._lock:
+            rows = self._conn.execute("SELECT COALESCE(validation, ''), COUNT(*) FROM games GROUP BY validation").fetchall()
+        counts = {status: count for status, count in rows}
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def get(self, folder_name: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM games WHERE folder = ?", (folder_name,)).fetchone()
+        return _row_to_game(row) if row else None
+
+    def rebuild(self, workspace_dir: Path, manifest_games: Optional[Dict[str, Dict]] = None) -> int:
+        """Indexes game folders that are on disk but not in the catalog (games from before the catalog existed).
+
+        Games sit in theme folders (<theme>/<game>) or, from older runs, directly in the workspace.
+        Their theme is unknown; the name and model come from the manifest when it has the folder.
+        """
+        added = 0
+        for game_dir in sorted(_game_dirs(workspace_dir)):
+            key = folder_key(self.workspace_dir, game_dir)
+            if self.get(key) is None:
+                entry = (manifest_games or {}).get(key, {})
+                self.record(game_dir, "", entry.get("name", game_dir.name), model=entry.get("model"))
+                added += 1
+        return added
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m game_catalog", description="Katalóg vygenerovaných hier.")
+    parser.add_argument("--workspace", type=Path, default=None, help="Pracovný priestor (predvolene WORKSPACE_DIR).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild", help="Doplní do katalógu hry, ktoré sú na disku, ale chýbajú v ňom.")
+    search = commands.add_parser("search", help="Vyhľadá hry podľa názvu, témy alebo inštrukcie.")
+    search.add_argument("query", nargs="?", default="")
+    search.add_argument("--status", choices=VALIDATION_STATUSES, default=None)
+    search.add_argument("-n", "--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    from workspace_manifest import WorkspaceManifest # Lazy: the catalog itself does not need the manifest
+    workspace_dir = args.workspace or Path(os.getenv("WORKSPACE_DIR", "workspace"))
+    catalog = GameCatalog(workspace_dir / CATALOG_NAME)
+    if args.command == "rebuild":
+        added = catalog.rebuild(workspace_dir, WorkspaceManifest(workspace_dir).games)
+        print(f"Pridaných {added} hier, spolu {catalog.counts()['total']}.", file=sys.stderr)
+    else:
+        print(json.dumps({"total": catalog.count(args.query, args.status),
+                          "games": catalog.search(args.query, args.status, args.limit)}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1012 @@
+# game_pipeline.py - Multi-agent game generation pipeline (LangGraph), importable without Streamlit
+import os
+from pathlib import Path
+import hashlib
+import json
+import time
+import re
+import operator
+import itertools
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Annotated, TypedDict, List, Dict, Optional, Sequence, Tuple
+from dotenv import load_dotenv
+from rate_limiter import RateLimiter, SqliteRateLimiter, estimate_tokens
+from llm_hedging import Hedger, LLMTimeoutError
+from llm_cache import LLMCache, CacheMiss, make_cache_key
+from llm_json import JsonArrayStreamParser, TruncatedJsonError, salvage_json, strip_code_fences
+from llm_backends import GenerativeBackend, create_model
+from metrics import (LLMCallRecord, game_scope, label_game, record_batch, record_hedge_saving, record_llm_call,
+                     record_reused_game, record_validation, current_run, timed_node)
+from workspace_manifest import WorkspaceManifest
+from game_store import BlobStore, GameWriter, clean_stale_staging, is_safe_filename, write_run_archive
+from game_validation import GameValidator
+from game_catalog import CATALOG_NAME, GameCatalog
+import event_log
+# langgraph and google.generativeai are imported lazily (see build_graph / get_model) to keep startup cheap
+
+load_dotenv()
+
+# --- Constants ---
+WORKSPACE_DIR = Path(os.getenv("WORKSPACE_DIR", "workspace"))
+MAX_GAMES = int(os.getenv("MAX_GAMES", "16")) # Target number of games
+MAX_CONCURRENT_WORKERS = int(os.getenv("MAX_CONCURRENT_WORKERS", "4")) # 1 = original sequential worker loop
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "10")) # Requests per minute shared by all workers
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "250000")) # Tokens per minute shared by all workers
+GEMINI_RATE_LIMIT_DB = os.getenv("GEMINI_RATE_LIMIT_DB", "") # SQLite file holding the RPM/TPM budget shared by all processes ("" = per process)
+STREAM_WORKER_OUTPUT = os.getenv("STREAM_WORKER_OUTPUT", "1") == "1" # Write game files while tokens arrive
+WORKSPACE_DEDUP = os.getenv("WORKSPACE_DEDUP", "1") == "1" # Hardlink identical files to one blob in WORKSPACE_DIR/.blobs
+PRECOMPRESS_GAME_FILES = os.getenv("PRECOMPRESS_GAME_FILES", "1") == "1" # Write .gz (and .br with brotli installed) next to text assets
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "1")) # Games requested per LLM call (1 = one call per game)
+REUSE_UNCHANGED_GAMES = os.getenv("REUSE_UNCHANGED_GAMES", "1") == "1" # Default for skipping games the manifest marks unchanged
+VALIDATE_GAMES = os.getenv("VALIDATE_GAMES", "1") == "1" # Static checks of every saved game; failing games get one repair call
+GAME_VALIDATION_WORKERS = int(os.getenv("GAME_VALIDATION_WORKERS", "2")) # Processes running the checks, 0 = in the worker thread
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini") # gemini | fake (simulated, offline)
+model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-pro-exp-03-25") # Using a potentially faster model
+GENERATION_CONFIG: Dict = {} # Passed to the model and part of the LLM cache key
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "readwrite") # off | readwrite | replay (offline, fails on miss)
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", ".llm_cache/responses.sqlite3"))
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "512"))
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "720")) # 0 = entries never expire
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "600")) # Hard limit for one LLM request (streams: until the first chunk), 0 = none
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1" # Send a duplicate request when a call is slower than usual, keep the first answer
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "90")) # "Slower than usual" = this percentile of recent latencies
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "8")) # No hedging until this many calls were measured
+LLM_HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1")) # At most this share of recent calls gets a duplicate
+LLM_HEDGE_BUDGET_PER_MIN = float(os.getenv("LLM_HEDGE_BUDGET_PER_MIN", "5")) # ...and at most this many duplicates per minute
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", "archives")) # Packed runs (archive_run)
+CHECKPOINT_DB = Path(os.getenv("CHECKPOINT_DB", ".checkpoints/runs.sqlite3")) # Durable graph state for resuming runs
+
+rate_limiter = (SqliteRateLimiter(Path(GEMINI_RATE_LIMIT_DB), GEMINI_RPM, GEMINI_TPM) if GEMINI_RATE_LIMIT_DB
+                else RateLimiter(GEMINI_RPM, GEMINI_TPM))
+validator = GameValidator(GAME_VALIDATION_WORKERS) # The process pool starts with the first submitted game
+hedger = Hedger(enabled=LLM_HEDGE, pct=LLM_HEDGE_PERCENTILE, min_samples=LLM_HEDGE_MIN_SAMPLES, max_rate=LLM_HEDGE_MAX_RATE,
+                budget_per_minute=LLM_HEDGE_BUDGET_PER_MIN, timeout_s=LLM_TIMEOUT_S or None)
+
+@lru_cache(maxsize=None)
+def get_llm_cache() -> LLMCache:
+    """One cache connection per process, opened on first use."""
+    return LLMCache(LLM_CACHE_PATH, mode=LLM_CACHE_MODE, max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024),
+                    ttl_seconds=LLM_CACHE_TTL_HOURS * 3600 if LLM_CACHE_TTL_HOURS > 0 else None)
+
+_model: Optional[GenerativeBackend] = None
+_model_lock = threading.Lock()
+
+def get_model() -> GenerativeBackend:
+    """Creates the configured backend on first use, so importing this module stays cheap."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = create_model(LLM_BACKEND, model_name, GENERATION_CONFIG)
+        return _model
+
+def set_model(model: Optional[GenerativeBackend]) -> None:
+    """Replaces the model used by call_llm (e.g. a FakeGeminiModel in benchmarks); None resets it."""
+    global _model
+    with _model_lock:
+        _model = model
+
+# --- LangGraph State Definition ---
+class AgentState(TypedDict):
+    theme: str
+    game_concepts: Optional[List[str]]
+    game_plan: Optional[List[Dict[str, str]]] # List of {"concept": "...", "instruction": "..."}
+    current_game_index: int
+    worker_output: Optional[List[Dict[str, str]]] # Output from the worker agent for the current game
+    worker_game_dir: Optional[str] # Set when the worker already wrote worker_output to disk (streaming)
+    saved_games: List[Dict[str, str]] # List of {"name": "...", "folder": "..."}
+    error: Optional[str]
+    concurrency: int # Number of games generated at once (1 = sequential loop)
+    reuse_existing: bool # Skip the worker call for games whose manifest fingerprint still matches
+    batch_size: int # Games generated per LLM call by worker_batch (1 = per-game workers)
+    parallel_results: Annotated[List[Dict], operator.add] # Written only by fan-out worker tasks
+    validation: Dict[str, Dict] # Game folder -> game_validation result, filled by check_games
+    repair_results: Annotated[List[Dict], operator.add] # Written only by repair_game tasks
+
+class WorkerTask(TypedDict):
+    """Input of a single fan-out worker task (sent via `Send`)."""
+    theme: str
+    game_index: int # 0-based position in game_plan
+    game: Dict[str, str] # {"concept": "...", "instruction": "..."}
+    reuse_existing: bool
+
+class WorkerBatchTask(TypedDict):
+    """Input of a batched worker (sent via `Send`): several games generated by one LLM call."""
+    theme: str
+    games: List[Dict] # [{"game_index": 0-based position in game_plan, "game": {"concept", "instruction"}}]
+    reuse_existing: bool
+
+class RepairTask(TypedDict):
+    """Input of a repair_game task (sent via `Send`): a saved game that failed validation."""
+    theme: str
+    game_index: int
+    game: Dict[str, str]
+    errors: List[str]
+
+# --- Helper Functions ---
+def sanitize_foldername(name: str) -> str:
+    """Creates a safe folder name from a game concept."""
+    name = re.sub(r'[^\w\s-]', '', name).strip().lower()
+    name = re.sub(r'[-\s]+', '_', name)
+    return name if name else "untitled_game"
+
+def theme_folder_name(theme: str) -> str:
+    """Folder of one theme's games; the hash keeps themes apart that sanitize to the same name."""
+    return f"{sanitize_foldername(theme)[:48]}_{hashlib.sha256(theme.encode('utf-8')).hexdigest()[:8]}"
+
+def game_folder_name(theme: str, game_name: str, game_index: int) -> str:
+    """Workspace-relative folder of a game (<theme>/<concept>_NN); also its key in the manifest and catalog.
+
+    Games of different themes never share a folder, so concurrent job workers cannot overwrite each other.
+    """
+    return f"{theme_folder_name(theme)}/{sanitize_foldername(game_name)}_{game_index:02d}"
+
+# One manifest / blob store per workspace; the lock keeps concurrent workers from opening two
+_workspace_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _manifest_for(workspace_dir: Path) -> WorkspaceManifest:
+    return WorkspaceManifest(workspace_dir)
+
+def get_manifest() -> WorkspaceManifest:
+    """Manifest of the current WORKSPACE_DIR (resolved on every call; benchmarks swap the workspace)."""
+    with _workspace_lock:
+        return _manifest_for(WORKSPACE_DIR)
+
+@lru_cache(maxsize=None)
+def _blob_store_for(workspace_dir: Path) -> BlobStore:
+    clean_stale_staging(workspace_dir)
+    store = BlobStore(workspace_dir, dedup=WORKSPACE_DEDUP)
+    store.gc()
+    return store
+
+def get_blob_store() -> BlobStore:
+    with _workspace_lock:
+        return _blob_store_for(WORKSPACE_DIR)
+
+@lru_cache(maxsize=None)
+def _catalog_for(workspace_dir: Path) -> GameCatalog:
+    return GameCatalog(workspace_dir / CATALOG_NAME)
+
+def get_catalog() -> GameCatalog:
+    """Searchable index of the games in WORKSPACE_DIR, shared by all runs and processes."""
+    with _workspace_lock:
+        return _catalog_for(WORKSPACE_DIR)
+
+def catalog_game(theme: str, game: Dict[str, str], game_dir: str) -> None:
+    """Indexes (or refreshes) a saved game; a catalog error is logged, it never fails the run."""
+    run = current_run()
+    try:
+        get_catalog().record(Path(game_dir), theme, game["concept"], game["instruction"], run.run_id if run else None, model_name)
+    except (sqlite3.Error, OSError) as e:
+        event_log.warning(f"⚠️ Hru '{game['concept']}' sa nepodarilo zapísať do katalógu: {e}")
+
+def catalog_validation(results: Dict[str, Dict], repaired: bool = False) -> None:
+    try:
+        get_catalog().record_validation(results, repaired)
+    except sqlite3.Error as e:
+        event_log.warning(f"⚠️ Výsledky kontroly sa nepodarilo zapísať do katalógu: {e}")
+
+def open_game_writer(theme: str, game_name: str, game_index: int) -> GameWriter:
+    """Staging writer for one game folder; nothing is visible in WORKSPACE_DIR until commit()."""
+    return GameWriter(WORKSPACE_DIR, game_folder_name(theme, game_name, game_index), get_blob_store(),
+                      precompress=PRECOMPRESS_GAME_FILES)
+
+def stage_game_file(writer: GameWriter, game_name: str, file_info: Dict[str, str]) -> None:
+    """Adds one file to a staged game, skipping (and logging) unsafe or incomplete entries."""
+    filename = file_info.get("filename")
+    content = file_info.get("content")
+    if filename and content is not None:
+        # Basic security check
+        if not is_safe_filename(filename):
+            event_log.warning(f"⚠️ Preskočený nebezpečný názov súboru v hre {game_name}: {filename}")
+            return
+        writer.add(filename, content)
+    else:
+         event_log.warning(f"⚠️ Chýbajúce 'filename' alebo 'content' v dátach pre hru {game_name}: {file_info}")
+
+def commit_game(writer: GameWriter, game_name: str, fingerprint: Optional[str] = None) -> str:
+    """Publishes a staged game folder and records it in the manifest when a fingerprint is given."""
+    game_dir = writer.commit()
+    if fingerprint:
+        get_manifest().record(game_dir, game_name, fingerprint, model_name, writer.filenames)
+    return str(game_dir)
+
+def save_game_files(theme: str, game_name: str, game_index: int, files_data: List[Dict[str, str]],
+                    fingerprint: Optional[str] = None) -> Optional[str]:
+    """Saves generated files to a dedicated game folder (staged, then swapped in atomically); with a fingerprint the game is also recorded in the manifest."""
+    writer = open_game_writer(theme, game_name, game_index)
+    try:
+        for file_info in files_data:
+            stage_game_file(writer, game_name, file_info)
+        return commit_game(writer, game_name, fingerprint) # Return the path to the created directory
+    except Exception as e:
+        writer.abort()
+        event_log.error(f"🔴 Chyba pri ukladaní súborov pre hru '{game_name}' do '{writer.folder_name}': {e}")
+        return None
+
+def submit_validation(game_dir: Optional[str], files_data: Optional[List[Dict[str, str]]] = None) -> None:
+    """Starts the static checks of a game in the process pool and returns at once; check_games collects the result.
+
+    files_data validates content that is only about to be saved to game_dir (sequential, non-streaming worker).
+    """
+    if not VALIDATE_GAMES or not game_dir:
+        return
+    if files_data is None:
+        validator.submit_folder(game_dir)
+    else:
+        validator.submit_files(game_dir, {f["filename"]: str(f["content"]) for f in files_data
+                                          if is_valid_file_entry(f) and is_safe_filename(f["filename"])})
+
+def format_repair_notes(errors: Sequence[str], limit: int = 10) -> str:
+    return "\n".join(f"    - {error}" for error in errors[:limit])
+
+def archive_run(run_id: str, saved_games: List[Dict[str, str]], fmt: str = "zip") -> Path:
+    """Packs the saved games of a run into ARCHIVE_DIR/<run_id>.<fmt> (zip, tar, tar.gz or tar.xz)."""
+    game_dirs = [Path(game["folder"]) for game in saved_games if game.get("folder") and Path(game["folder"]).is_dir()]
+    return write_run_archive(game_dirs, ARCHIVE_DIR / f"{run_id}.{fmt}")
+
+def settle_usage(response, reserved_tokens: int, record: LLMCallRecord) -> None:
+    """Settles the rate limiter with the real token usage and adds it to the call record."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    record.prompt_tokens += getattr(usage, "prompt_token_count", 0) or 0
+    record.output_tokens += getattr(usage, "candidates_token_count", 0) or 0
+    record.cached_prompt_tokens += getattr(usage, "cached_content_token_count", 0) or 0
+    # The reservation estimates the prompt, so the TPM bucket settles against the prompt count; the total only without it
+    actual_tokens = getattr(usage, "prompt_token_count", 0) or getattr(usage, "total_token_count", 0)
+    if actual_tokens:
+        rate_limiter.record_usage(actual_tokens, reserved_tokens)
+
+def request_options() -> Dict:
+    """Extra generate_content arguments; the client-side timeout frees the HTTP request of an abandoned attempt."""
+    return {"request_options": {"timeout": LLM_TIMEOUT_S}} if LLM_TIMEOUT_S else {}
+
+def hedged_request(kind: str, attempt, reserved_tokens: int, record: LLMCallRecord):
+    """Runs attempt() through the hedger; a duplicate is only sent if the rate limiter has room right now."""
+    try:
+        result, outcome = hedger.call(kind, attempt, reserve_hedge=lambda: rate_limiter.try_acquire(reserved_tokens),
+                                      on_saving=record_hedge_saving)
+    except LLMTimeoutError:
+        record.timed_out = True
+        raise
+    record.hedged = record.hedged or outcome.hedged
+    record.hedge_won = record.hedge_won or outcome.hedge_won
+    if outcome.hedge_won:
+        event_log.info(f"🏁 Záložná požiadavka odpovedala skôr (prah {outcome.threshold_s:.1f} s).")
+    return result
+
+def cached_llm_response(cache_key: str, read_cache: bool = True) -> Optional[str]:
+    """Cache lookup before an LLM call; read_cache=False (--regenerate) skips hits so the fresh answer replaces them.
+
+    Replay mode always reads: it must never reach the model.
+    """
+    cache = get_llm_cache()
+    if not read_cache and cache.mode != "replay":
+        return None
+    return cache.get(cache_key) # Raises CacheMiss in replay mode
+
+def call_llm(prompt: str, is_json_output: bool = True, read_cache: bool = True, retry_truncated: bool = True) -> str:
+    """ Helper function to call the LLM and handle potential errors.
+
+    retry_truncated=False gives up on a response cut off before any complete element instead of
+    asking again (a batch would hit the same output limit; its games fall back to their own calls).
+    """
+    cache_key = make_cache_key(model_name, prompt, {"generation_config": GENERATION_CONFIG, "json_output": is_json_output})
+    record = LLMCallRecord(kind="call")
+    started_at = time.perf_counter()
+    try:
+        cached_response = cached_llm_response(cache_key, read_cache)
+        if cached_response is not None:
+            record.cached = True
+            return cached_response
+        # Simple retry mechanism
+        for attempt in range(2):
+            record.retries = attempt
+            try:
+                reserved_tokens = estimate_tokens(prompt)
+                record.rate_limit_wait_s += rate_limiter.acquire(reserved_tokens)
+                response = hedged_request("call", lambda: get_model().generate_content(prompt, **request_options()),
+                                          reserved_tokens, record)
+                settle_usage(response, reserved_tokens, record)
+                # Basic validation if JSON is expected
+                if is_json_output:
+                    cleaned_response = response.text.strip()
+                    if cleaned_response.startswith("```"):
+                        cleaned_response = strip_code_fences(cleaned_response)
+                    try:
+                        # Try parsing to catch invalid JSON early
+                        json.loads(cleaned_response)
+                    except json.JSONDecodeError:
+                        # Repair the payload we already paid for before asking for a new one
+                        salvaged, rules = salvage_json(response.text)
+                        record.json_repairs = rules
+                        event_log.warning(f"🩹 Neplatný JSON z LLM opravený bez opakovania (pravidlá: {', '.join(rules)}).")
+                        cleaned_response = json.dumps(salvaged, ensure_ascii=False)
+                    get_llm_cache().put(cache_key, cleaned_response) # Only validated responses are cached
+                    return cleaned_response
+                else:
+                    get_llm_cache().put(cache_key, response.text)
+                    return response.text
+            except Exception as inner_e:
+                if "429" in str(inner_e) and attempt == 0:
+                    event_log.warning("⏳ Limit API prekročený, čakám na uvoľnenie limitu pred opakovaním...")
+                    rate_limiter.backoff() # Next acquire() waits for a fresh request slot
+                    continue # Retry
+                elif isinstance(inner_e, LLMTimeoutError) and attempt == 0:
+                    event_log.warning(f"⌛ {inner_e} Skúšam znova...")
+                    continue # Retry once; a hung request is usually not repeated
+                elif isinstance(inner_e, TruncatedJsonError) and not retry_truncated:
+                    raise
+                elif is_json_output and isinstance(inner_e, ValueError):
+                     # Raised by salvage_json: the response was beyond repair, regenerate as a last resort
+                     event_log.warning(f"⚠️ LLM vrátilo neopraviteľný JSON, skúšam znova... Chyba: {inner_e}")
+                     if attempt == 0: continue # Retry on first JSON error
+                     else: raise # Raise error on second JSON failure
+                else:
+                    raise # Re-raise other errors or errors on second attempt
+        # If loop finishes without returning/raising (e.g., due to retries)
+        raise Exception("LLM volanie zlyhalo po opakovaniach.")
+
+    except CacheMiss:
+        record.ok = False
+        raise # Replay mode must fail loudly instead of returning an error payload
+    except Exception as e:
+        record.ok = False
+        event_log.error(f"🔴 Volanie LLM zlyhalo: {e}")
+        # Return an error structure if JSON was expected
+        if is_json_output:
+            return json.dumps([{"action": "chat", "content": f"Chyba volania LLM: {e}"}])
+        else:
+            return f"Chyba volania LLM: {e}"
+    finally:
+        record.latency_s = time.perf_counter() - started_at
+        record_llm_call(record)
+
+# --- Agent Node Functions ---
+# Nodes return only the keys they change; progress goes to the run's event_log, not the graph state
+
+def games_planner_node(state: AgentState) -> Dict:
+    """Generates a list of game concepts based on the theme."""
+    theme = state["theme"]
+    event_log.info(f"🤖 GAMES_PLANNER: Generujem {MAX_GAMES} konceptov hier pre tému '{theme}'...")
+
+    prompt = f"""
+    Si kreatívny plánovač hier. Vytvor zoznam {MAX_GAMES} jednoduchých konceptov webových hier (HTML, CSS, JS) na tému '{theme}'.
+    Zameraj sa na jednoduché, dobre známe herné mechaniky.
+    Odpovedz IBA platným JSON poľom reťazcov obsahujúcim názvy herných konceptov.
+
+    Príklad pre tému 'vesmír':
+    ["Hádaj planétu", "Vesmírny kliker", "Pexeso s kozmickými loďami", "Kvíz o súhvezdiach", ...]
+    """
+    try:
+        response_text = call_llm(prompt, is_json_output=True)
+        game_concepts = json.loads(response_text)
+        if not isinstance(game_concepts, list) or not all(isinstance(item, str) for item in game_concepts):
+            raise ValueError("LLM nevrátilo platný zoznam názvov hier.")
+        event_log.info(f"✅ GAMES_PLANNER: Koncepty hier vygenerované ({len(game_concepts)} hier).")
+        return {"game_concepts": game_concepts[:MAX_GAMES], "error": None}
+    except CacheMiss:
+        raise
+    except Exception as e:
+        error_msg = f"🔴 GAMES_PLANNER zlyhal: {e}"
+        event_log.error(error_msg)
+        return {"error": error_msg}
+
+def profesor_planner_node(state: AgentState) -> Dict:
+    """Refines the game concepts with aesthetic instructions."""
+    game_concepts = state.get("game_concepts")
+    if not game_concepts:
+        error_msg = "🔴 PROFESOR_PLANNER: Chýbajú herné koncepty."
+        event_log.error(error_msg)
+        return {"error": error_msg}
+
+    event_log.info("🧑‍🏫 PROFESOR_PLANNER: Pridávam inštrukcie pre vizuálnu stránku ku každému konceptu...")
+
+    game_plan = []
+    for concept in game_concepts:
+        instruction = (
+            f"Vytvor jednoduchú webovú hru '{concept}'. "
+            f"Prioritou je vytvoriť **vizuálne krásne a pútavé používateľské rozhranie (UI)** pomocou moderného CSS. "
+            f"Zahrň relevantnú **grafiku** (zváž SVG, CSS art alebo jednoduché obrázky, ak je to vhodné) a pútavé **CSS animácie**. "
+            f"Vzhľad a dojem sú dôležitejšie ako zložitá herná logika. Hra by mala byť hrateľná, ale jednoduchá."
+        )
+        game_plan.append({"concept": concept, "instruction": instruction})
+
+    event_log.info("✅ PROFESOR_PLANNER: Herný plán s inštrukciami vytvorený.")
+    return {"game_plan": game_plan, "error": None}
+
+def build_worker_prompt(theme: str, concept: str, instruction: str, repair_notes: Optional[str] = None) -> str:
+    """Builds the file-generation prompt for one game; repair_notes lists problems of a previous version to fix."""
+    repair = f"""
+    Predchádzajúca verzia tejto hry neprešla kontrolou. Vygeneruj všetky súbory znova a oprav tieto chyby:
+{repair_notes}
+    """ if repair_notes else ""
+    return f"""
+    Si expert na vývoj webových hier (HTML, CSS, JavaScript). Tvojou úlohou je vytvoriť súbory pre jednoduchú webovú hru.
+
+    Téma: '{theme}'
+    Koncept hry: '{concept}'
+    Špecifické inštrukcie: '{instruction}'
+
+    Požiadavky na výstup:
+    1. Vygeneruj potrebné súbory (typicky index.html, style.css, script.js).
+    2. Zameraj sa na vizuálnu stránku podľa inštrukcií (krásne UI, grafika, animácie).
+    3. Udržuj kód jednoduchý a funkčný pre daný koncept.
+    4. Všetky súbory musia byť samostatné (žiadne externé závislosti okrem bežných prehliadačových API).
+    5. Odpovedz IBA platným JSON poľom objektov, kde každý objekt reprezentuje jeden súbor.
+       Formát objektu súboru: {{"filename": "nazov_suboru.ext", "content": "obsah súboru ako reťazec..."}}
+    6. Dôsledne dodržuj JSON formátovanie: dvojité úvodzovky pre kľúče a reťazce, správne escapovanie špeciálnych znakov (\\n, \\", atď.) v obsahu súboru.
+
+    Príklad JSON výstupu:
+    [
+      {{"filename": "index.html", "content": "<!DOCTYPE html>..."}},
+      {{"filename": "style.css", "content": "body {{ ... }}"}},
+      {{"filename": "script.js", "content": "console.log('Hello');"}}
+    ]
+    {repair}"""
+
+# Fixed instructions first and byte-identical in every batch, so the provider can reuse the prompt prefix
+WORKER_BATCH_PROMPT_PREFIX = """
+    Si expert na vývoj webových hier (HTML, CSS, JavaScript). Tvojou úlohou je vytvoriť súbory pre niekoľko jednoduchých webových hier naraz.
+
+    Požiadavky na výstup pre každú hru:
+    1. Vygeneruj potrebné súbory (typicky index.html, style.css, script.js).
+    2. Zameraj sa na vizuálnu stránku podľa inštrukcií (krásne UI, grafika, animácie).
+    3. Udržuj kód jednoduchý a funkčný pre daný koncept.
+    4. Všetky súbory musia byť samostatné (žiadne externé závislosti okrem bežných prehliadačových API).
+    5. Odpovedz IBA platným JSON objektom. Kľúčom je ID hry zo zoznamu nižšie, hodnotou JSON pole objektov súborov danej hry.
+       Formát objektu súboru: {"filename": "nazov_suboru.ext", "content": "obsah súboru ako reťazec..."}
+    6. Dôsledne dodržuj JSON formátovanie: dvojité úvodzovky pre kľúče a reťazce, správne escapovanie špeciálnych znakov (\\n, \\", atď.) v obsahu súboru.
+    7. Vráť všetky hry zo zoznamu, každú pod jej ID.
+
+    Príklad JSON výstupu pre hry s ID "g0" a "g1":
+    {
+      "g0": [{"filename": "index.html", "content": "<!DOCTYPE html>..."}, {"filename": "style.css", "content": "body { ... }"}],
+      "g1": [{"filename": "index.html", "content": "<!DOCTYPE html>..."}, {"filename": "script.js", "content": "console.log('Hello');"}]
+    }
+"""
+
+def build_batch_worker_prompt(theme: str, items: Sequence[Dict]) -> str:
+    """Builds one prompt for several games: the shared prefix, then the theme and the keyed game list."""
+    games = "\n".join(f'    - ID "g{item["game_index"]}": koncept \'{item["game"]["concept"]}\', inštrukcie: \'{item["game"]["instruction"]}\''
+                      for item in items)
+    return f"{WORKER_BATCH_PROMPT_PREFIX}\n    Téma: '{theme}'\n\n    Hry:\n{games}\n"
+
+def game_fingerprint(theme: str, concept: str, instruction: str) -> str:
+    """Identifies the exact request that generates a game: prompt, model and generation config."""
+    return make_cache_key(model_name, build_worker_prompt(theme, concept, instruction), {"generation_config": GENERATION_CONFIG})
+
+def reusable_game_dir(theme: str, concept: str, instruction: str, game_index: int) -> Optional[str]:
+    """Folder of an identical, intact game from an earlier run, if any; counts the LLM call it saves."""
+    game_dir = get_manifest().lookup(game_folder_name(theme, concept, game_index), game_fingerprint(theme, concept, instruction))
+    if game_dir is None:
+        return None
+    record_reused_game()
+    return str(game_dir)
+
+def generate_game_files(theme: str, concept: str, instruction: str, repair_notes: Optional[str] = None,
+                        read_cache: bool = True) -> List[Dict[str, str]]:
+    """Calls the LLM for one game and validates the returned list of files."""
+    response_text = call_llm(build_worker_prompt(theme, concept, instruction, repair_notes), is_json_output=True,
+                             read_cache=read_cache)
+    files_data = json.loads(response_text)
+    if not isinstance(files_data, list) or not all(is_valid_file_entry(item) for item in files_data):
+         raise ValueError("LLM nevrátilo platný zoznam súborov v JSON formáte.")
+    return files_data
+
+def is_valid_file_entry(item) -> bool:
+    return isinstance(item, dict) and "filename" in item and "content" in item
+
+def generate_game_batch(theme: str, items: Sequence[Dict], read_cache: bool = True) -> Dict[int, List[Dict[str, str]]]:
+    """Asks for several games in one call and returns the valid file lists by game_index; missing or broken games are left out."""
+    prompt = build_batch_worker_prompt(theme, items)
+    per_game_tokens = {item["game_index"]: estimate_tokens(build_worker_prompt(theme, item["game"]["concept"], item["game"]["instruction"]))
+                       for item in items}
+    files_by_index: Dict[int, List[Dict[str, str]]] = {}
+    try:
+        # A truncated answer keeps its complete "gN" members; only the missing games get their own call
+        response = json.loads(call_llm(prompt, is_json_output=True, read_cache=read_cache, retry_truncated=False))
+        if not isinstance(response, dict):
+            raise ValueError("LLM nevrátilo JSON objekt s hrami podľa ID.")
+        for item in items:
+            files_data = response.get(f"g{item['game_index']}")
+            if isinstance(files_data, list) and files_data and all(is_valid_file_entry(f) for f in files_data):
+                files_by_index[item["game_index"]] = files_data
+    except CacheMiss:
+        raise
+    except Exception as e:
+        event_log.warning(f"⚠️ Dávkové generovanie {len(items)} hier zlyhalo ({e}), generujem ich samostatne...")
+    record_batch(games=len(items), generated=len(files_by_index), prompt_tokens_est=estimate_tokens(prompt),
+                 per_game_prompt_tokens_est=sum(per_game_tokens.values()),
+                 fallback_prompt_tokens_est=sum(t for i, t in per_game_tokens.items() if i not in files_by_index))
+    return files_by_index
+
+def stream_game_files(theme: str, concept: str, instruction: str, game_index: int, repair_notes: Optional[str] = None,
+                      read_cache: bool = True) -> Tuple[List[Dict[str, str]], str, Dict[str, float]]:
+    """Streams the worker response and stages every file object as soon as it is complete.
+
+    The staged folder is published in one rename once the response is complete. Returns
+    (files_data, game_dir, timings) where timings holds time-to-first-file and time-to-last-file
+    in seconds. Falls back to the non-streaming call_llm path on any error.
+    """
+    prompt = build_worker_prompt(theme, concept, instruction, repair_notes)
+    cache_key = make_cache_key(model_name, prompt, {"generation_config": GENERATION_CONFIG, "json_output": True})
+    started_at = time.perf_counter()
+    files_data: List[Dict[str, str]] = []
+    timings: Dict[str, float] = {}
+    record = LLMCallRecord(kind="stream")
+    writer = open_game_writer(theme, concept, game_index)
+
+    def flush(file_info: Dict[str, str]) -> None:
+        if not is_valid_file_entry(file_info):
+            raise ValueError(f"LLM vrátilo neplatný objekt súboru: {str(file_info)[:80]}")
+        stage_game_file(writer, concept, file_info)
+        files_data.append(file_info)
+        timings.setdefault("first_file_s", time.perf_counter() - started_at)
+        timings["last_file_s"] = time.perf_counter() - started_at
+
+    try:
+        cached_response = cached_llm_response(cache_key, read_cache)
+        if cached_response is not None:
+            record.cached = True
+            for file_info in json.loads(cached_response):
+                flush(file_info)
+        else:
+            reserved_tokens = estimate_tokens(prompt)
+            record.rate_limit_wait_s = rate_limiter.acquire(reserved_tokens)
+            started_at = time.perf_counter()
+
+            def open_stream():
+                # Hedged on time to first chunk; the loser's stream is simply never read
+                stream = get_model().generate_content(prompt, stream=True, **request_options())
+                stream_iter = iter(stream)
+                return stream, stream_iter, next(stream_iter, None)
+
+            response, stream_iter, first_chunk = hedged_request("stream", open_stream, reserved_tokens, record)
+            parser = JsonArrayStreamParser() # Holds raw text only from an object it cannot decode on
+            for chunk in itertools.chain([first_chunk] if first_chunk is not None else [], stream_iter):
+                for file_info in parser.feed(chunk.text):
+                    flush(file_info)
+            settle_usage(response, reserved_tokens, record)
+            if parser.failed or not parser.finished:
+                # Only the part the parser did not extract is repaired; files already flushed stay as they are
+                try:
+                    salvaged, rules = salvage_json(parser.unparsed_text())
+                except TruncatedJsonError:
+                    if not files_data:
+                        raise
+                    salvaged, rules = [], ["truncated_array"] # Cut off between or inside files; the complete ones are kept
+                record.json_repairs = rules
+                if not isinstance(salvaged, list):
+                    raise ValueError("Opravená odpoveď nie je JSON pole súborov.")
+                event_log.warning(f"🩹 Streamovaný JSON pre '{concept}' opravený (pravidlá: {', '.join(rules)}).")
+                for file_info in salvaged:
+                    flush(file_info)
+            if not files_data:
+                raise ValueError("Streamovaná odpoveď neobsahuje žiadne súbory.")
+            get_llm_cache().put(cache_key, json.dumps(files_data, ensure_ascii=False))
+        record.latency_s = time.perf_counter() - started_at
+        record_llm_call(record)
+    except CacheMiss:
+        writer.abort()
+        raise
+    except Exception as e:
+        writer.abort()
+        record.ok = False
+        record.latency_s = time.perf_counter() - started_at
+        record_llm_call(record) # The fallback below records its own call
+        if "429" in str(e):
+            rate_limiter.backoff()
+        event_log.warning(f"⚠️ Streamovanie pre '{concept}' zlyhalo ({e}), skúšam bez streamovania...")
+        files_data = generate_game_files(theme, concept, instruction, repair_notes, read_cache)
+        started_at = time.perf_counter()
+        game_dir = save_game_files(theme, concept, game_index, files_data, fingerprint=game_fingerprint(theme, concept, instruction))
+        timings = {"first_file_s": time.perf_counter() - started_at, "last_file_s": time.perf_counter() - started_at}
+        if not game_dir:
+            raise IOError(f"Nepodarilo sa uložiť súbory pre '{concept}'.")
+        return files_data, game_dir, timings
+    try:
+        game_dir = commit_game(writer, concept, game_fingerprint(theme, concept, instruction))
+    except OSError as e:
+        writer.abort()
+        raise IOError(f"Nepodarilo sa uložiť súbory pre '{concept}': {e}") from e
+    return files_data, game_dir, timings
+
+def format_stream_timings(concept: str, timings: Dict[str, float]) -> str:
+    return (f"⏱️ '{concept}': prvý súbor po {timings.get('first_file_s', 0):.1f} s, "
+            f"posledný po {timings.get('last_file_s', 0):.1f} s.")
+
+def worker_node(state: AgentState) -> Dict:
+    """Generates the files for the current game based on the plan."""
+    game_plan = state.get("game_plan")
+    current_index = state.get("current_game_index", 0)
+
+    if not game_plan or current_index >= len(game_plan):
+        error_msg = f"🔴 WORKER: Neplatný herný plán alebo index ({current_index})."
+        event_log.error(error_msg)
+        return {"error": error_msg}
+
+    current_game = game_plan[current_index]
+    concept = current_game["concept"]
+    instruction = current_game["instruction"]
+    theme = state["theme"]
+
+    label_game(current_index, concept)
+    reuse_existing = state.get("reuse_existing", True) # False (--regenerate) also bypasses cached LLM answers
+    if reuse_existing:
+        reused_dir = reusable_game_dir(theme, concept, instruction, current_index + 1)
+        if reused_dir:
+            event_log.info(f"♻️ WORKER: Hra {current_index + 1}/{len(game_plan)} '{concept}' sa nezmenila, bez volania LLM.")
+            return {"worker_output": None, "worker_game_dir": reused_dir, "error": None}
+    event_log.info(f"👷 WORKER: Začínam generovať hru {current_index + 1}/{len(game_plan)}: '{concept}'...")
+
+    try:
+        if STREAM_WORKER_OUTPUT:
+            files_data, game_dir, timings = stream_game_files(theme, concept, instruction, current_index + 1,
+                                                              read_cache=reuse_existing)
+            event_log.info(f"✅ WORKER: Súbory pre '{concept}' vygenerované a priebežne uložené.")
+            event_log.info(format_stream_timings(concept, timings))
+            return {"worker_output": files_data, "worker_game_dir": game_dir, "error": None}
+        files_data = generate_game_files(theme, concept, instruction, read_cache=reuse_existing)
+        event_log.info(f"✅ WORKER: Súbory pre '{concept}' vygenerované.")
+        return {"worker_output": files_data, "worker_game_dir": None, "error": None}
+    except CacheMiss:
+        raise
+    except Exception as e:
+        error_msg = f"🔴 WORKER zlyhal pri generovaní '{concept}': {e}"
+        event_log.error(error_msg)
+        # Still proceed to next game, but log the error
+        return {"worker_output": None, "worker_game_dir": None, "error": error_msg} # Allow graph to continue
+
+def new_result(index: int, concept: str) -> Dict:
+    return {"index": index, "name": concept, "folder": None, "error": None, "reused": False}
+
+def reuse_game(theme: str, index: int, game: Dict[str, str]) -> Optional[Dict]:
+    """Result for a game the manifest marks unchanged, or None if it has to be generated."""
+    reused_dir = reusable_game_dir(theme, game["concept"], game["instruction"], index + 1)
+    if not reused_dir:
+        return None
+    event_log.info(f"♻️ WORKER {index + 1}: Hra '{game['concept']}' sa nezmenila, bez volania LLM.")
+    submit_validation(reused_dir)
+    return {**new_result(index, game["concept"]), "folder": reused_dir, "reused": True}
+
+def finish_result(result: Dict, game_dir: Optional[str]) -> Dict:
+    if game_dir:
+        result["folder"] = game_dir
+        submit_validation(game_dir) # Checked in another process while the next game is generated
+        event_log.info(f"✅ Hra '{result['name']}' uložená do '{Path(game_dir).name}'.")
+    else:
+        result["error"] = f"❌ Nepodarilo sa uložiť súbory pre '{result['name']}'."
+        event_log.error(result["error"])
+    return result
+
+def produce_game(theme: str, index: int, game: Dict[str, str], repair_notes: Optional[str] = None,
+                 read_cache: bool = True) -> Dict:
+    """Generates and saves one game with its own LLM call and returns its fan-out result."""
+    concept = game["concept"]
+    result = new_result(index, concept)
+    if not repair_notes:
+        event_log.info(f"👷 WORKER {index + 1}: Začínam generovať hru '{concept}'...")
+    try:
+        if STREAM_WORKER_OUTPUT:
+            _, game_dir, timings = stream_game_files(theme, concept, game["instruction"], index + 1, repair_notes, read_cache)
+            event_log.info(format_stream_timings(concept, timings))
+        else:
+            files_data = generate_game_files(theme, concept, game["instruction"], repair_notes, read_cache)
+            game_dir = save_game_files(theme, concept, index + 1, files_data,
+                                       fingerprint=game_fingerprint(theme, concept, game["instruction"]))
+    except CacheMiss:
+        raise
+    except Exception as e:
+        result["error"] = f"🔴 WORKER zlyhal pri generovaní '{concept}': {e}"
+        event_log.error(result["error"])
+        return result
+    return finish_result(result, game_dir)
+
+def worker_task_node(task: WorkerTask) -> Dict:
+    """Fan-out variant of worker + save_and_log: generates and saves one game, returns its result."""
+    index = task["game_index"]
+    label_game(index, task["game"]["concept"])
+    reuse_existing = task.get("reuse_existing", True) # False (--regenerate) also bypasses cached LLM answers
+    result = reuse_game(task["theme"], index, task["game"]) if reuse_existing else None
+    return {"parallel_results": [result or produce_game(task["theme"], index, task["game"], read_cache=reuse_existing)]}
+
+def worker_batch_node(task: WorkerBatchTask) -> Dict:
+    """Generates several games with one LLM call; games missing or broken in the answer get their own call."""
+    theme = task["theme"]
+    reuse_existing = task.get("reuse_existing", True) # False (--regenerate) also bypasses cached LLM answers
+    results, pending = [], []
+    for item in task["games"]:
+        index, game = item["game_index"], item["game"]
+        label_game(index, game["concept"])
+        with game_scope(index):
+            result = reuse_game(theme, index, game) if reuse_existing else None
+        if result:
+            results.append(result)
+        else:
+            pending.append(item)
+
+    files_by_index: Dict[int, List[Dict[str, str]]] = {}
+    if len(pending) > 1:
+        event_log.info(f"👷 WORKER: Generujem {len(pending)} hier jedným volaním: "
+                       + ", ".join(f"{item['game_index'] + 1}. '{item['game']['concept']}'" for item in pending))
+        files_by_index = generate_game_batch(theme, pending, read_cache=reuse_existing)
+
+    for item in pending:
+        index, game = item["game_index"], item["game"]
+        with game_scope(index):
+            files_data = files_by_index.get(index)
+            if files_data is None:
+                if len(pending) > 1:
+                    event_log.warning(f"⚠️ Hra '{game['concept']}' chýba alebo je poškodená v dávkovej odpovedi, generujem ju samostatne...")
+                results.append(produce_game(theme, index, game, read_cache=reuse_existing))
+                continue
+            game_dir = save_game_files(theme, game["concept"], index + 1, files_data,
+                                       fingerprint=game_fingerprint(theme, game["concept"], game["instruction"]))
+            results.append(finish_result(new_result(index, game["concept"]), game_dir))
+    return {"parallel_results": results}
+
+def collect_results_node(state: AgentState) -> Dict:
+    """Merges fan-out worker results into saved_games, in game_plan order."""
+    results = sorted(state.get("parallel_results", []), key=lambda r: r["index"])
+    saved_games = state.get("saved_games", [])
+    errors = []
+    for result in results:
+        if result["folder"]:
+            saved_games.append({"name": result["name"], "folder": result["folder"]})
+            catalog_game(state["theme"], state["game_plan"][result["index"]], result["folder"])
+        if result["error"]:
+            errors.append(result["error"])
+    reused = sum(1 for result in results if result["reused"])
+    event_log.info(f"🏁 Paralelné generovanie dokončené: {len(saved_games)}/{len(results)} hier uložených"
+                   f" ({reused} nezmenených bez volania LLM).")
+    return {"saved_games": saved_games,
+            "current_game_index": len(state.get("game_plan") or []),
+            "error": errors[-1] if errors else None}
+
+def save_and_log_node(state: AgentState) -> Dict:
+    """Saves the generated files and updates the list of saved games."""
+    worker_output = state.get("worker_output")
+    game_plan = state.get("game_plan")
+    current_index = state.get("current_game_index", 0)
+    saved_games = state.get("saved_games", [])
+    game_dir = state.get("worker_game_dir") # Already written while streaming, or reused via the manifest
+
+    if (worker_output or game_dir) and game_plan and current_index < len(game_plan):
+        concept = game_plan[current_index]["concept"]
+        if not game_dir:
+            event_log.info(f"💾 Ukladám súbory pre hru '{concept}'...")
+            game_dir = save_game_files(state["theme"], concept, current_index + 1, worker_output,
+                                       fingerprint=game_fingerprint(state["theme"], concept, game_plan[current_index]["instruction"]))
+
+        if game_dir:
+            saved_games.append({"name": concept, "folder": game_dir})
+            catalog_game(state["theme"], game_plan[current_index], game_dir)
+            event_log.info(f"✅ Hra '{concept}' uložená do '{Path(game_dir).name}'.")
+        else:
+            # Error logged in save_game_files; the content validate_node submitted never reached the disk
+            validator.discard(str(WORKSPACE_DIR / game_folder_name(state["theme"], concept, current_index + 1)))
+            event_log.error(f"❌ Nepodarilo sa uložiť súbory pre '{concept}'.")
+
+    elif not worker_output and state.get("error"):
+         # Error already logged by worker
+         pass # Just move to the next game
+    else:
+        event_log.warning(f"🤔 Preskakujem ukladanie pre hru index {current_index} (žiadny výstup alebo neplatný stav).")
+
+
+    # Increment index for the next iteration
+    next_index = current_index + 1
+    return {"saved_games": saved_games, "current_game_index": next_index, "worker_output": None, "worker_game_dir": None} # Clear worker output
+
+def validate_node(state: AgentState) -> Dict:
+    """Hands the current game to the validation pool and moves on without waiting for the result."""
+    game_plan = state.get("game_plan")
+    current_index = state.get("current_game_index", 0)
+    if VALIDATE_GAMES and game_plan and current_index < len(game_plan):
+        game_dir = state.get("worker_game_dir")
+        if game_dir:
+            submit_validation(game_dir)
+        elif state.get("worker_output"):
+            # Not saved yet: check the content under the folder save_and_log is going to write
+            folder = str(WORKSPACE_DIR / game_folder_name(state["theme"], game_plan[current_index]["concept"], current_index + 1))
+            submit_validation(folder, state["worker_output"])
+    return {}
+
+def check_games_node(state: AgentState) -> Dict:
+    """Collects the validation results of every saved game; most were checked while later games were generating."""
+    if not VALIDATE_GAMES:
+        return {}
+    validation = {}
+    for game in state.get("saved_games") or []:
+        if game.get("folder"):
+            validation[game["folder"]] = validator.result(game["folder"])
+            record_validation(validation[game["folder"]])
+    catalog_validation(validation)
+    failed = {folder: result for folder, result in validation.items() if result["ok"] is False}
+    unchecked = [folder for folder, result in validation.items() if result["ok"] is None]
+    for folder, result in failed.items():
+        event_log.warning(f"🧪 Hra '{Path(folder).name}' neprešla kontrolou: " + "; ".join(result["errors"][:3]))
+    for folder in unchecked:
+        event_log.warning(f"⏳ Kontrola hry '{Path(folder).name}' nedobehla včas, hra zostáva neskontrolovaná.")
+    event_log.info(f"🧪 Kontrola hier: {len(validation) - len(failed) - len(unchecked)}/{len(validation)} v poriadku"
+                   + (f", {len(unchecked)} neskontrolovaných" if unchecked else "")
+                   + (f", {len(failed)} pôjde na opravu." if failed else "."))
+    return {"validation": validation}
+
+def repair_game_node(task: RepairTask) -> Dict:
+    """Regenerates one game that failed validation, telling the model what was wrong, and checks it again."""
+    index, game = task["game_index"], task["game"]
+    folder_name = game_folder_name(task["theme"], game["concept"], index + 1)
+    folder = str(WORKSPACE_DIR / folder_name)
+    event_log.info(f"🔧 Opravujem hru '{game['concept']}' ({len(task['errors'])} chýb)...")
+    result = produce_game(task["theme"], index, game, repair_notes=format_repair_notes(task["errors"]))
+    # A failed repair leaves the previous version in place (writes are atomic), so check whatever is on disk
+    validation = validator.result(folder)
+    repaired = bool(result["folder"]) and validation["ok"] is True
+    record_validation(validation, repair=True)
+    if validation["ok"] is False:
+        get_manifest().forget(folder_name) # Do not reuse a known-broken game in later runs
+        event_log.error(f"❌ Hra '{game['concept']}' ani po oprave neprešla kontrolou: " + "; ".join(validation["errors"][:3]))
+    return {"repair_results": [{"index": index, "folder": folder, "repaired": repaired, "validation": validation}]}
+
+def apply_repairs_node(state: AgentState) -> Dict:
+    """Merges the repair_game results into the validation map."""
+    validation = dict(state.get("validation") or {})
+    results = state.get("repair_results") or []
+    for result in results:
+        validation[result["folder"]] = {**result["validation"], "repaired": result["repaired"]}
+        if Path(result["folder"]).is_dir(): # The repair rewrote the folder: refresh its sizes
+            catalog_game(state["theme"], state["game_plan"][result["index"]], result["folder"])
+        catalog_validation({result["folder"]: result["validation"]}, repaired=result["repaired"])
+    event_log.info(f"🔧 Opravené hry: {sum(1 for r in results if r['repaired'])}/{len(results)}.")
+    return {"validation": validation}
+
+# --- Conditional Edge ---
+def should_continue(state: AgentState) -> str:
+    """Determines whether to continue the loop or end."""
+    current_index = state.get("current_game_index", 0)
+    game_plan = state.get("game_plan", [])
+    error = state.get("error")
+
+    # Stop if major error occurred before worker loop
+    if not game_plan and error:
+        return "end_process"
+
+    if current_index >= len(game_plan) or current_index >= MAX_GAMES:
+        return "end_process"
+    else:
+        return "continue_worker"
+
+def route_after_plan(state: AgentState):
+    """Starts the sequential worker loop, or fans the plan out to concurrent worker tasks / batches."""
+    batch_size = state.get("batch_size", 1)
+    if state.get("concurrency", 1) <= 1 and batch_size <= 1:
+        return should_continue(state)
+    game_plan = state.get("game_plan") or []
+    if not game_plan:
+        return "end_process"
+    from langgraph.types import Send
+    reuse_existing = state.get("reuse_existing", True)
+    items = [{"game_index": i, "game": game} for i, game in enumerate(game_plan[:MAX_GAMES])]
+    if batch_size > 1:
+        # Up to `concurrency` batches run at once (max_concurrency in run_config), like single-game tasks
+        return [Send("worker_batch", {"theme": state["theme"], "games": items[i:i + batch_size], "reuse_existing": reuse_existing})
+                for i in range(0, len(items), batch_size)]
+    return [Send("worker_task", {"theme": state["theme"], **item, "reuse_existing": reuse_existing}) for item in items]
+
+def route_after_check(state: AgentState):
+    """Sends every game that failed validation to its own repair_game task, or ends the run."""
+    validation = state.get("validation") or {}
+    game_plan = state.get("game_plan") or []
+    failed = {folder: result for folder, result in validation.items() if result["ok"] is False}
+    if not failed:
+        return "done"
+    from langgraph.types import Send
+    tasks = []
+    for index, game in enumerate(game_plan[:MAX_GAMES]):
+        folder = str(WORKSPACE_DIR / game_folder_name(state["theme"], game["concept"], index + 1))
+        if folder in failed:
+            tasks.append(Send("repair_game", {"theme": state["theme"], "game_index": index, "game": game,
+                                              "errors": failed[folder]["errors"]}))
+    return tasks or "done"
+
+# --- Build the Graph ---
+def build_graph(checkpointer=None):
+    """Builds and compiles the LangGraph pipeline. Pass a checkpointer to make runs resumable.
+
+    Every node is wrapped by metrics.timed_node, which records its wall time into the
+    RunMetrics started with metrics.start_run() (no-op when no run is active).
+    """
+    from langgraph.graph import StateGraph, END
+
+    graph_builder = StateGraph(AgentState)
+    wrap = timed_node
+
+    graph_builder.add_node("games_planner", wrap("games_planner", games_planner_node))
+    graph_builder.add_node("profesor_planner", wrap("profesor_planner", profesor_planner_node))
+    graph_builder.add_node("worker", wrap("worker", worker_node))
+    graph_builder.add_node("save_and_log", wrap("save_and_log", save_and_log_node))
+    graph_builder.add_node("worker_task", wrap("worker_task", worker_task_node))
+    graph_builder.add_node("worker_batch", wrap("worker_batch", worker_batch_node))
+    graph_builder.add_node("collect_results", wrap("collect_results", collect_results_node))
+    graph_builder.add_node("validate", wrap("validate", validate_node))
+    graph_builder.add_node("check_games", wrap("check_games", check_games_node))
+    graph_builder.add_node("repair_game", wrap("repair_game", repair_game_node))
+    graph_builder.add_node("apply_repairs", wrap("apply_repairs", apply_repairs_node))
+
+    graph_builder.set_entry_point("games_planner")
+    graph_builder.add_edge("games_planner", "profesor_planner")
+
+    # Conditional loop for worker (or fan-out to concurrent worker tasks)
+    graph_builder.add_conditional_edges(
+        "profesor_planner",
+        route_after_plan,
+        {
+            "continue_worker": "worker", # Start worker loop if plan exists
+            "fan_out": "worker_task", # Never returned as a string; route_after_plan sends Send() packets here
+            "fan_out_batches": "worker_batch", # Likewise, for batch_size > 1
+            "end_process": END
+        }
+    )
+    graph_builder.add_conditional_edges(
+        "save_and_log", # After saving/logging, check if loop should continue
+        should_continue,
+        {
+            "continue_worker": "worker", # Go back to worker for next game
+            "end_process": "check_games"
+        }
+    )
+    graph_builder.add_edge("worker", "validate") # validate only submits the game to the process pool
+    graph_builder.add_edge("validate", "save_and_log")
+    graph_builder.add_edge("worker_task", "collect_results") # Runs once, after every Send() task finished
+    graph_builder.add_edge("worker_batch", "collect_results")
+    graph_builder.add_edge("collect_results", "check_games")
+    graph_builder.add_conditional_edges(
+        "check_games",
+        route_after_check,
+        {
+            "repair": "repair_game", # Never returned as a string; route_after_check sends Send() packets here
+            "done": END
+        }
+    )
+    graph_builder.add_edge("repair_game", "apply_repairs")
+    graph_builder.add_edge("apply_repairs", END)
+
+    return graph_builder.compile(checkpointer=checkpointer)
+
+def open_checkpointer(path: Path = CHECKPOINT_DB):
+    """SQLite checkpointer; state is saved after every node, keyed by run (thread) id."""
+    import sqlite3
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Job worker processes share the file; wait for another process's write instead of failing after 5 s
+    return SqliteSaver(sqlite3.connect(str(path), timeout=30, check_same_thread=False))
+
+def run_config(run_id: str, concurrency: int) -> Dict:
+    # max_concurrency bounds how many fan-out worker tasks LangGraph runs at once;
+    # the sequential loop needs three supersteps per game, more than older LangGraph defaults allow
+    return {"configurable": {"thread_id": run_id}, "max_concurrency": concurrency,
+            "recursion_limit": 3 * MAX_GAMES + 10}
+
+def make_initial_state(theme: str, concurrency: int = MAX_CONCURRENT_WORKERS, reuse_existing: bool = REUSE_UNCHANGED_GAMES,
+                       batch_size: int = WORKER_BATCH_SIZE) -> AgentState:
+    """Initial state for a new run."""
+    return AgentState(
+        theme=theme,
+        game_concepts=None,
+        game_plan=None,
+        current_game_index=0,
+        worker_output=None,
+        worker_game_dir=None,
+        saved_games=[],
+        error=None,
+        concurrency=concurrency,
+        reuse_existing=reuse_existing,
+        batch_size=batch_size,
+        validation={}
+    )
@@ -0,0 +1,185 @@
+# game_server.py - Embedded static server for generated games: precompressed files, ETag, Cache-Control, ranges
+"""
+Usage:
+    python -m game_server --port 8765 workspace
+
+Started automatically by app.py (GAME_SERVER_HOST / GAME_SERVER_PORT). Only files inside game
+folders are served; dot-paths (.blobs, .staging, ...) and the workspace root are not.
+"""
+import argparse
+import email.utils
+import logging
+import mimetypes
+import os
+import re
+import sys
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+GAME_SERVER_HOST = os.getenv("GAME_SERVER_HOST", "127.0.0.1")
+GAME_SERVER_PORT = int(os.getenv("GAME_SERVER_PORT", "8765")) # 0 = any free port
+GAME_SERVER_PUBLIC_URL = os.getenv("GAME_SERVER_PUBLIC_URL", "") # Base URL for links when behind a proxy
+ASSET_MAX_AGE = int(os.getenv("GAME_SERVER_MAX_AGE", "300")) # Seconds browsers may reuse CSS/JS/images without asking
+
+# Served instead of the plain file when the client accepts it, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+logger = logging.getLogger(__name__)
+
+
+class GameRequestHandler(BaseHTTPRequestHandler):
+    """GET/HEAD for files under `root`; picks a precompressed sibling (.br/.gz) when the client accepts it."""
+
+    protocol_version = "HTTP/1.1" # Keep-alive: a game page and its assets share one connection
+    server_version = "GameServer/1.0"
+    root: Path # Set by make_handler
+
+    def do_GET(self) -> None:
+        self._serve(send_body=True)
+
+    def do_HEAD(self) -> None:
+        self._serve(send_body=False)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _resolve(self) -> Optional[Path]:
+        """Maps the URL path to a file inside a game folder, or None if it must not be served."""
+        parts = [p for p in unquote(urlsplit(self.path).path).split("/") if p]
+        if not parts or any(p.startswith(".") or "\\" in p for p in parts):
+            return None
+        path = self.root.joinpath(*parts)
+        if path.is_dir():
+            path = path / "index.html"
+        if len(path.relative_to(self.root).parts) < 2 or not path.is_file():
+            return None # Workspace root files (manifest.json) are not part of any game
+        return path
+
+    def _pick_encoding(self, path: Path) -> Tuple[Path, Optional[str]]:
+        accepted = {token.split(";")[0].strip() for token in self.headers.get("Accept-Encoding", "").split(",")}
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted:
+                candidate = path.with_name(path.name + suffix)
+                if candidate.is_file():
+                    return candidate, encoding
+        return path, None
+
+    def _serve(self, send_body: bool) -> None:
+        path = self._resolve()
+        if path is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        range_header = self.headers.get("Range")
+        # Byte ranges refer to the plain file, so ranged requests are never served compressed
+        body_path, encoding = (path, None) if range_header else self._pick_encoding(path)
+        try:
+            f = open(body_path, "rb")
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+            if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self._common_headers(path, etag, stat.st_mtime)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            start, end = 0, stat.st_size - 1
+            status = HTTPStatus.OK
+            if range_header and self.headers.get("If-Range", etag) == etag:
+                match = RANGE_RE.match(range_header.strip())
+                # last < first is syntactically invalid: the header is ignored and the whole file served (RFC 9110 14.1.1)
+                if match and match.group(1) and match.group(2) and int(match.group(2)) < int(match.group(1)):
+                    match = None
+                if match and (match.group(1) or match.group(2)):
+                    if match.group(1):
+                        start = int(match.group(1))
+                        end = min(int(match.group(2)), end) if match.group(2) else end
+                    else: # Suffix range: the last N bytes
+                        start = max(0, stat.st_size - int(match.group(2)))
+                    if start > end:
+                        self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                        self.send_header("Content-Range", f"bytes */{stat.st_size}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    status = HTTPStatus.PARTIAL_CONTENT
+
+            length = end - start + 1 if stat.st_size else 0
+            self.send_response(status)
+            self._common_headers(path, etag, stat.st_mtime)
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            if status == HTTPStatus.PARTIAL_CONTENT:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{stat.st_size}")
+            self.send_header("Content-Length", str(length))
+            self.end_headers()
+            if send_body and length:
+                try:
+                    self.connection.sendfile(f, start, length) # Zero-copy where the OS supports it
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True # Client went away (e.g. closed the preview tab)
+
+    def _common_headers(self, path: Path, etag: str, mtime: float) -> None:
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+            content_type += "; charset=utf-8"
+        self.send_header("Content-Type", content_type)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", email.utils.formatdate(mtime, usegmt=True))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Vary", "Accept-Encoding")
+        # Pages are regenerated in place, so HTML is always revalidated (cheap 304 via ETag)
+        if path.suffix in (".html", ".htm"):
+            self.send_header("Cache-Control", "no-cache")
+        else:
+            self.send_header("Cache-Control", f"public, max-age={ASSET_MAX_AGE}")
+
+
+def make_handler(root: Path) -> type:
+    return type("BoundGameRequestHandler", (GameRequestHandler,), {"root": root.resolve()})
+
+
+def start_server(root: Path, host: str = GAME_SERVER_HOST, port: int = GAME_SERVER_PORT) -> ThreadingHTTPServer:
+    """Starts serving `root` on a daemon thread and returns the server (server.server_address has the port)."""
+    root.mkdir(parents=True, exist_ok=True)
+    server = ThreadingHTTPServer((host, port), make_handler(root))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="game-server", daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    if GAME_SERVER_PUBLIC_URL:
+        return GAME_SERVER_PUBLIC_URL.rstrip("/")
+    host, port = server.server_address[:2]
+    return f"http://{'localhost' if host in ('0.0.0.0', '127.0.0.1') else host}:{port}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m game_server", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", type=Path, nargs="?", default=Path(os.getenv("WORKSPACE_DIR", "workspace")))
+    parser.add_argument("--host", default=GAME_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=GAME_SERVER_PORT)
+    args = parser.parse_args(argv)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.root))
+    server.daemon_threads = True
+    print(f"Hry z '{args.root}' na {base_url(server)}/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+# game_store.py - Atomic game folder writes, a content-addressed blob store and run archives
+import gzip
+import hashlib
+import os
+import shutil
+import tarfile
+import threading
+import time
+import uuid
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    import brotli # Optional: without it only .gz variants are written
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl # POSIX
+except ImportError:
+    fcntl = None
+    import msvcrt # Windows
+
+BLOBS_DIR = ".blobs"
+STAGING_DIR = ".staging"
+TRASH_DIR = ".trash"
+COMMIT_LOCK = ".commit.lock"
+COMPRESSIBLE_SUFFIXES = (".html", ".htm", ".css", ".js", ".mjs", ".json", ".svg", ".txt", ".xml")
+PRECOMPRESSED_SUFFIXES = (".gz", ".br")
+PRECOMPRESS_MIN_BYTES = 256
+ARCHIVE_FORMATS = {".zip": "zip", ".tar": "tar", ".tar.gz": "gztar", ".tgz": "gztar", ".tar.xz": "xztar"}
+BLOB_GC_MIN_AGE_S = 3600 # Unlinked blobs younger than this may be in use by another process that is about to link them
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Exclusive lock across processes (job workers, dashboard) held on `path`; blocks until it is free."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass # LK_LOCK gives up after 10 s; keep waiting
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def folder_key(workspace_dir: Path, game_dir: Path) -> str:
+    """Workspace-relative path of a game folder ("<theme>/<game>"), its key in the manifest and the catalog."""
+    return Path(os.path.relpath(game_dir, workspace_dir)).as_posix()
+
+
+def is_safe_filename(filename: str) -> bool:
+    return ".." not in filename and not filename.startswith(("/", "\\"))
+
+
+def precompressed_variants(filename: str, content: bytes) -> Dict[str, bytes]:
+    """Returns {"<filename>.gz": ..., "<filename>.br": ...} for text assets worth compressing."""
+    if not filename.lower().endswith(COMPRESSIBLE_SUFFIXES) or len(content) < PRECOMPRESS_MIN_BYTES:
+        return {}
+    variants = {f"{filename}.gz": gzip.compress(content, compresslevel=9, mtime=0)} # mtime=0: identical input, identical blob
+    if brotli is not None:
+        variants[f"{filename}.br"] = brotli.compress(content, quality=11)
+    return {name: data for name, data in variants.items() if len(data) < len(content) * 0.9}
+
+
+def is_precompressed_variant(path: Path) -> bool:
+    return path.suffix in PRECOMPRESSED_SUFFIXES and path.with_suffix("").is_file()
+
+
+class BlobStore:
+    """Stores each distinct file content once under <workspace>/.blobs/<sha[:2]>/<sha> and hardlinks it into games.
+
+    Hardlinked game files share their inode with the blob, so editing one in place would edit every
+    game using it; blobs are therefore read-only (except on Windows, where read-only files cannot be
+    deleted) and the pipeline only ever replaces whole folders. Where hardlinks are not supported
+    (other filesystem, some Windows setups) files are copied instead.
+    """
+
+    def __init__(self, workspace_dir: Path, dedup: bool = True):
+        self.root = workspace_dir / BLOBS_DIR
+        self.dedup = dedup
+        self._lock = threading.Lock()
+        self.files_written = 0
+        self.dedup_hits = 0 # Files whose content was already in the store
+        self.bytes_saved = 0
+
+    def place(self, content: bytes, target: Path) -> None:
+        """Writes `content` to `target` (a new path inside a staging folder)."""
+        if not self.dedup:
+            target.write_bytes(content)
+            return
+        digest = hashlib.sha256(content).hexdigest()
+        blob = self.root / digest[:2] / digest
+        existed = blob.exists()
+        if not existed:
+            self._write_blob(blob, content)
+        try:
+            try:
+                os.link(blob, target)
+            except FileNotFoundError:
+                # gc() in another process removed an old unlinked blob between exists() and link()
+                self._write_blob(blob, content)
+                os.link(blob, target)
+        except OSError:
+            shutil.copyfile(blob, target)
+        with self._lock:
+            self.files_written += 1
+            if existed:
+                self.dedup_hits += 1
+                self.bytes_saved += len(content)
+
+    @staticmethod
+    def _write_blob(blob: Path, content: bytes) -> None:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        tmp_blob = blob.with_name(f"{blob.name}.{uuid.uuid4().hex}.tmp")
+        tmp_blob.write_bytes(content)
+        if os.name != "nt":
+            os.chmod(tmp_blob, 0o444)
+        os.replace(tmp_blob, blob) # Concurrent writers of the same content race harmlessly
+
+    def gc(self, min_age_s: float = BLOB_GC_MIN_AGE_S) -> int:
+        """Deletes blobs no game links to any more (link count 1); returns how many were removed.
+
+        Other processes may share the store, so only blobs (and leftover .tmp files) whose inode has
+        not changed for `min_age_s` are removed: a blob that was just written or just lost a link
+        (ctime changes with the link count) may be about to be linked into a game.
+        """
+        removed = 0
+        if not self.root.exists():
+            return 0
+        cutoff = time.time() - min_age_s
+        for blob in self.root.glob("*/*"):
+            try:
+                stat = blob.stat()
+                if (blob.suffix == ".tmp" or stat.st_nlink == 1) and stat.st_ctime < cutoff:
+                    blob.unlink()
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"files_written": self.files_written, "dedup_hits": self.dedup_hits, "bytes_saved": self.bytes_saved}
+
+
+class GameWriter:
+    """Collects the files of one game in a staging folder and publishes them with a rename.
+
+    Until commit() the final folder keeps its previous content (or does not exist), so a crash
+    mid-game never leaves a half-written game behind; abort() or a later cleanup removes the staging folder.
+    folder_name is relative to the workspace and may be nested (<theme>/<game>).
+    """
+
+    def __init__(self, workspace_dir: Path, folder_name: str, store: BlobStore, precompress: bool = True):
+        self.workspace_dir = workspace_dir
+        self.folder_name = folder_name
+        self.final_dir = workspace_dir / folder_name
+        # Flat staging/trash entries, so clean_stale_staging never sees a shared parent folder
+        self.staging_dir = workspace_dir / STAGING_DIR / f"{self.final_dir.name}.{uuid.uuid4().hex[:8]}"
+        self.store = store
+        self.precompress = precompress
+        self.filenames: List[str] = [] # Generated files only, without the .gz/.br variants
+
+    def add(self, filename: str, content: str) -> None:
+        if not is_safe_filename(filename):
+            raise ValueError(f"Nebezpečný názov súboru: {filename}")
+        data = content.encode("utf-8")
+        files = {filename: data}
+        if self.precompress:
+            files.update(precompressed_variants(filename, data)) # Served by game_server without compressing per request
+        for name, payload in files.items():
+            target = self.staging_dir / name
+            target.parent.mkdir(parents=True, exist_ok=True) # Ensure subdirs within game folder are created
+            if target.exists():
+                target.unlink() # Same filename twice in one response: the later one wins
+            self.store.place(payload, target)
+        if filename not in self.filenames:
+            self.filenames.append(filename)
+
+    def commit(self) -> Path:
+        """Moves the staged game into place, replacing any previous version of the folder.
+
+        The two renames run under a workspace-wide lock file, so writers of the same folder in other
+        processes (the same theme in two jobs) never interleave them; the last writer wins.
+        """
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        trash = None
+        with file_lock(self.workspace_dir / COMMIT_LOCK):
+            self.final_dir.parent.mkdir(parents=True, exist_ok=True)
+            if self.final_dir.exists():
+                trash = self.workspace_dir / TRASH_DIR / f"{self.final_dir.name}.{uuid.uuid4().hex[:8]}"
+                trash.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(self.final_dir, trash)
+            os.replace(self.staging_dir, self.final_dir)
+        if trash is not None:
+            shutil.rmtree(trash, ignore_errors=True)
+        return self.final_dir
+
+    def abort(self) -> None:
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+
+def clean_stale_staging(workspace_dir: Path, max_age_s: float = 3600) -> None:
+    """Removes staging/trash folders left behind by crashed runs."""
+    cutoff = time.time() - max_age_s
+    for name in (STAGING_DIR, TRASH_DIR):
+        for leftover in (workspace_dir / name).glob("*"):
+            try:
+                if leftover.stat().st_mtime < cutoff:
+                    shutil.rmtree(leftover, ignore_errors=True)
+            except OSError:
+                pass
+
+
+def archive_format(path: Path) -> Optional[str]:
+    name = path.name.lower()
+    for suffix, fmt in ARCHIVE_FORMATS.items():
+        if name.endswith(suffix):
+            return fmt
+    return None
+
+
+def write_run_archive(game_dirs: Iterable[Path], path: Path) -> Path:
+    """Streams the given game folders into one .zip/.tar/.tar.gz/.tar.xz file, one file at a time.
+
+    Tar archives keep the hardlinks between identical files, so shared content is stored once.
+    Precompressed .gz/.br variants are left out; they only exist for game_server.
+    """
+    fmt = archive_format(path)
+    if fmt is None:
+        raise ValueError(f"Nepodporovaný formát archívu '{path.name}', povolené: {', '.join(ARCHIVE_FORMATS)}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        if fmt == "zip":
+            with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+                for game_dir in game_dirs:
+                    for file in sorted(p for p in game_dir.rglob("*") if p.is_file() and not is_precompressed_variant(p)):
+                        archive.write(file, f"{game_dir.name}/{file.relative_to(game_dir).as_posix()}")
+        else:
+            mode = {"tar": "w", "gztar": "w:gz", "xztar": "w:xz"}[fmt]
+            with tarfile.open(tmp_path, mode) as archive:
+                for game_dir in game_dirs:
+                    archive.add(game_dir, arcname=game_dir.name,
+                                filter=lambda info: None if info.name.endswith(PRECOMPRESSED_SUFFIXES) else info)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return path
@@ -0,0 +1,455 @@
+# game_validation.py - Static checks of generated games (HTML, JS syntax, cross-file references, sizes) in a process pool
+import json
+import multiprocessing
+import os
+import posixpath
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from game_store import is_precompressed_variant
+
+try:
+    import esprima # Optional: exact JS parser; without it `node --check` or a bracket check is used
+except ImportError:
+    esprima = None
+
+GAME_MAX_FILE_KB = int(os.getenv("GAME_MAX_FILE_KB", "512"))
+GAME_MAX_TOTAL_KB = int(os.getenv("GAME_MAX_TOTAL_KB", "2048"))
+GAME_VALIDATION_TIMEOUT_S = float(os.getenv("GAME_VALIDATION_TIMEOUT_S", "60"))
+NODE_BINARY = os.getenv("GAME_VALIDATION_NODE", "node") # "" disables the node fallback
+MAX_ISSUES_PER_FILE = 5
+
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+# End tags browsers infer, so leaving them out is not an error
+OPTIONAL_END_TAGS = {"html", "head", "body", "p", "li", "dt", "dd", "option", "optgroup", "tr", "td", "th",
+                     "thead", "tbody", "tfoot", "colgroup", "caption", "rt", "rp"}
+MEDIA_ELEMENTS = {"img", "audio", "video", "source", "track", "iframe", "embed"}
+
+MODULE_SYNTAX_RE = re.compile(r"^\s*(?:import\s*[\w{*'\"]|export\s)", re.MULTILINE)
+JS_IMPORT_RE = re.compile(r"""(?:^\s*import\s[^'"]*?from\s*|^\s*import\s*|\bimport\s*\(\s*)['"]([^'"]+)['"]""", re.MULTILINE)
+CSS_URL_RE = re.compile(r"""url\(\s*['"]?([^'")]+?)['"]?\s*\)""")
+CSS_IMPORT_RE = re.compile(r"""@import\s+(?:url\()?\s*['"]([^'"]+)['"]""")
+REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "void", "yield", "await", "delete", "throw", "new"}
+
+
+# --- JavaScript ---
+def js_checker() -> str:
+    """Which syntax checker check_js uses here: "esprima", "node" or "brackets"."""
+    if esprima is not None:
+        return "esprima"
+    if NODE_BINARY and shutil.which(NODE_BINARY):
+        return "node"
+    return "brackets"
+
+
+def check_js(code: str, module: bool = False) -> Optional[str]:
+    """Returns a syntax error description ("line: message") or None if the script parses."""
+    return check_scripts({"": (code, module)}).get("")
+
+
+def check_scripts(scripts: Dict[str, Tuple[str, bool]]) -> Dict[str, str]:
+    """Checks several scripts ({label: (code, is_module)}) at once; returns {label: error} for those that do not parse."""
+    scripts = {label: (code, module or bool(MODULE_SYNTAX_RE.search(code))) for label, (code, module) in scripts.items()}
+    checker = js_checker()
+    errors: Dict[str, str] = {}
+    if checker == "esprima":
+        for label, (code, module) in scripts.items():
+            try:
+                (esprima.parseModule if module else esprima.parseScript)(code)
+            except esprima.Error as e:
+                errors[label] = str(e)
+        return errors
+    unchecked = dict(scripts)
+    if checker == "node":
+        classic = {label: code for label, (code, module) in scripts.items() if not module}
+        node_errors = _node_compile(classic) if classic else {}
+        if node_errors is not None:
+            errors.update(node_errors)
+            for label in classic:
+                unchecked.pop(label)
+        for label, (code, module) in list(unchecked.items()):
+            if module:
+                error = _node_check(code, module)
+                if error != "":
+                    if error:
+                        errors[label] = error
+                    unchecked.pop(label)
+    for label, (code, _) in unchecked.items():
+        error = _bracket_check(code)
+        if error:
+            errors[label] = error
+    return errors
+
+
+# Compiles every classic script with vm.Script in one node process (starting node dominates the cost)
+NODE_COMPILE_SCRIPT = """
+const vm = require("vm"); let input = "";
+process.stdin.on("data", d => input += d).on("end", () => {
+  const errors = {};
+  for (const [label, code] of JSON.parse(input)) {
+    try { new vm.Script(code, {filename: "script"}); }
+    catch (e) { const m = /^script:(\\d+)/.exec(e.stack || ""); errors[label] = (m ? m[1] + ": " : "") + e.name + ": " + e.message; }
+  }
+  process.stdout.write(JSON.stringify(errors));
+});
+"""
+
+
+def _node_compile(scripts: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """{label: error} for classic scripts that do not compile; None if node could not be used."""
+    try:
+        proc = subprocess.run([NODE_BINARY, "-e", NODE_COMPILE_SCRIPT], input=json.dumps(list(scripts.items())),
+                              capture_output=True, text=True, encoding="utf-8", timeout=30)
+        return json.loads(proc.stdout) if proc.returncode == 0 else None
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+
+
+def _node_check(code: str, module: bool) -> Optional[str]:
+    """Runs `node --check` on the code (used for ES modules); "" means node itself could not be used."""
+    fd, path = tempfile.mkstemp(suffix=".mjs" if module else ".js")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(code)
+        proc = subprocess.run([NODE_BINARY, "--check", path], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.SubprocessError):
+        return ""
+    finally:
+        os.unlink(path)
+    if proc.returncode == 0:
+        return None
+    lines = proc.stderr.splitlines()
+    location = re.match(r".*:(\d+)$", lines[0]) if lines else None
+    message = next((line for line in lines if re.match(r"\w*Error\b", line)), lines[-1] if lines else "syntax error")
+    return f"{location.group(1)}: {message}" if location else message
+
+
+def _bracket_check(code: str) -> Optional[str]:
+    """Last-resort check without a JS parser: balanced brackets, closed strings, comments and template literals."""
+    closing = {")": "(", "]": "[", "}": "{"}
+    stack: List[Tuple[str, int]] = [] # (opening bracket or "${", line)
+    i, n, line = 0, len(code), 1
+    prev, prev_word = "", ""
+
+    def scan_template(i: int, line: int) -> Tuple[int, int, bool]:
+        """Scans template text from i; returns (next index, line, True if it stopped at a ${ expression)."""
+        while i < n:
+            c = code[i]
+            if c == "\\":
+                i += 2
+                continue
+            if c == "\n":
+                line += 1
+            if c == "`":
+                return i + 1, line, False
+            if code.startswith("${", i):
+                return i + 2, line, True
+            i += 1
+        raise ValueError(f"{line}: neukončený template literal")
+
+    try:
+        while i < n:
+            c = code[i]
+            if c == "\n":
+                line += 1
+            if c.isspace():
+                i += 1
+                continue
+            if code.startswith("//", i):
+                end = code.find("\n", i)
+                i = n if end == -1 else end
+                continue
+            if code.startswith("/*", i):
+                end = code.find("*/", i + 2)
+                if end == -1:
+                    return f"{line}: neukončený komentár"
+                line += code.count("\n", i, end)
+                i = end + 2
+                continue
+            if c in "'\"":
+                j = i + 1
+                while j < n and code[j] != c and code[j] != "\n":
+                    j += 2 if code[j] == "\\" else 1
+                if j >= n or code[j] == "\n":
+                    return f"{line}: neukončený reťazec"
+                i, prev = j + 1, "a"
+                continue
+            if c == "`":
+                i, line, in_expr = scan_template(i + 1, line)
+                if in_expr:
+                    stack.append(("${", line))
+                prev = "a"
+                continue
+            if c == "/" and (prev in REGEX_PRECEDERS or prev == "" or prev_word in REGEX_KEYWORDS):
+                j, in_class = i + 1, False
+                while j < n and code[j] != "\n" and (in_class or code[j] != "/"):
+                    if code[j] == "\\":
+                        j += 1
+                    elif code[j] == "[":
+                        in_class = True
+                    elif code[j] == "]":
+                        in_class = False
+                    j += 1
+                if j < n and code[j] == "/": # A regex literal; otherwise it was a division after all
+                    i, prev, prev_word = j + 1, "a", ""
+                    continue
+            if c.isalnum() or c in "_$":
+                j = i
+                while j < n and (code[j].isalnum() or code[j] in "_$"):
+                    j += 1
+                prev, prev_word = "a", code[i:j]
+                i = j
+                continue
+            if c in "([{":
+                stack.append((c, line))
+            elif c in ")]}":
+                if c == "}" and stack and stack[-1][0] == "${":
+                    stack.pop()
+                    i, line, in_expr = scan_template(i + 1, line)
+                    if in_expr:
+                        stack.append(("${", line))
+                    prev = "a"
+                    continue
+                if not stack or stack[-1][0] != closing[c]:
+                    return f"{line}: nečakaná '{c}'"
+                stack.pop()
+            prev, prev_word = c, ""
+            i += 1
+    except ValueError as e:
+        return str(e)
+    if stack:
+        bracket, opened = stack[-1]
+        return f"{opened}: neuzavretá '{bracket}'"
+    return None
+
+
+# --- HTML ---
+class _HTMLChecker(HTMLParser):
+    """Collects unbalanced tags, inline scripts and local references of one HTML file."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.errors: List[str] = []
+        self.open_tags: List[Tuple[str, int]] = []
+        self.scripts: List[Tuple[str, bool, int]] = [] # (code, is_module, line)
+        self.references: List[Tuple[str, str]] = [] # (url, "code" | "media")
+        self.module_sources: List[str] = [] # src of <script type="module">
+        self._script: Optional[List[str]] = None
+        self._script_module = False
+        self._script_line = 0
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        attrs = {name: value or "" for name, value in attrs}
+        if tag == "script":
+            self._script_module = attrs.get("type", "") == "module"
+            if attrs.get("src"):
+                self.references.append((attrs["src"], "code"))
+                if self._script_module:
+                    self.module_sources.append(attrs["src"])
+            else:
+                self._script, self._script_line = [], self.getpos()[0]
+        elif tag == "link" and attrs.get("href"):
+            rel = attrs.get("rel", "").lower()
+            if "stylesheet" in rel or "modulepreload" in rel:
+                self.references.append((attrs["href"], "code"))
+            elif "icon" in rel or "preload" in rel:
+                self.references.append((attrs["href"], "media"))
+        elif tag in MEDIA_ELEMENTS and attrs.get("src"):
+            self.references.append((attrs["src"], "media"))
+        if tag not in VOID_ELEMENTS:
+            self.open_tags.append((tag, self.getpos()[0]))
+
+    def handle_startendtag(self, tag: str, attrs) -> None:
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS: # <div/> or SVG <path/>: already closed
+            self.open_tags.pop()
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "script" and self._script is not None:
+            self.scripts.append(("".join(self._script), self._script_module, self._script_line))
+            self._script = None
+        if tag in VOID_ELEMENTS:
+            return
+        if not any(name == tag for name, _ in self.open_tags):
+            if tag not in OPTIONAL_END_TAGS:
+                self.errors.append(f"{self.getpos()[0]}: </{tag}> bez otváracej značky")
+            return
+        while self.open_tags:
+            name, line = self.open_tags.pop()
+            if name == tag:
+                break
+            if name not in OPTIONAL_END_TAGS:
+                self.errors.append(f"{line}: <{name}> nie je uzavretá pred </{tag}>")
+
+    def handle_data(self, data: str) -> None:
+        if self._script is not None:
+            self._script.append(data)
+
+    def close(self) -> None:
+        super().close()
+        for name, line in self.open_tags:
+            if name not in OPTIONAL_END_TAGS:
+                self.errors.append(f"{line}: <{name}> nie je uzavretá")
+
+
+# --- Whole game ---
+def resolve_reference(source: str, url: str) -> Optional[str]:
+    """Path of a local reference relative to the game folder; None for external URLs and anchors."""
+    url = url.strip().split("#")[0].split("?")[0]
+    if not url or url.startswith("//") or re.match(r"^[a-zA-Z][a-zA-Z0-9+.-]*:", url):
+        return None
+    if url.startswith("/"):
+        return url # Absolute paths point outside the game folder on game_server
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source), url))
+
+
+def validate_files(files: Dict[str, str]) -> Dict:
+    """Runs every check on a game given as {filename: content}; safe to run in a worker process."""
+    started = time.perf_counter()
+    errors: List[str] = []
+    warnings: List[str] = []
+    sizes = {name: len(content.encode("utf-8")) for name, content in files.items()}
+    module_scripts = set()
+    references: List[Tuple[str, str, str]] = [] # (source file, url, kind)
+    scripts: Dict[str, Tuple[str, bool]] = {} # Error prefix -> (code, is_module), checked in one go
+
+    if "index.html" not in files:
+        errors.append("chýba index.html")
+    for name, size in sizes.items():
+        if size > GAME_MAX_FILE_KB * 1024:
+            errors.append(f"{name}: {size // 1024} kB, limit {GAME_MAX_FILE_KB} kB")
+    if sum(sizes.values()) > GAME_MAX_TOTAL_KB * 1024:
+        errors.append(f"hra má spolu {sum(sizes.values()) // 1024} kB, limit {GAME_MAX_TOTAL_KB} kB")
+
+    for name, content in sorted(files.items()):
+        lower = name.lower()
+        if lower.endswith((".html", ".htm")):
+            checker = _HTMLChecker()
+            checker.feed(content)
+            checker.close()
+            errors += [f"{name}:{issue}" for issue in checker.errors[:MAX_ISSUES_PER_FILE]]
+            scripts.update({f"{name}: {number}. inline skript (riadok {line}): ": (code, module)
+                            for number, (code, module, line) in enumerate(checker.scripts, 1) if code.strip()})
+            references += [(name, url, kind) for url, kind in checker.references]
+            module_scripts.update(resolve_reference(name, url) for url in checker.module_sources)
+        elif lower.endswith(".css"):
+            references += [(name, url, "code") for url in CSS_IMPORT_RE.findall(content)]
+            references += [(name, url, "media") for url in CSS_URL_RE.findall(content)]
+        elif lower.endswith(".json"):
+            try:
+                json.loads(content)
+            except ValueError as e:
+                errors.append(f"{name}: neplatný JSON ({e})")
+
+    for name, content in sorted(files.items()):
+        if name.lower().endswith((".js", ".mjs")):
+            scripts[f"{name}:"] = (content, name in module_scripts or name.lower().endswith(".mjs"))
+            references += [(name, url, "code") for url in JS_IMPORT_RE.findall(content) if url.startswith((".", "/"))]
+
+    errors += [label + error for label, error in check_scripts(scripts).items()]
+
+    for source, url, kind in references:
+        target = resolve_reference(source, url)
+        if target is None or target in files:
+            continue
+        problem = (f"{source}: odkaz '{url}' smeruje mimo hry" if target.startswith(("/", ".."))
+                   else f"{source}: chýba súbor '{target}'")
+        (errors if kind == "code" else warnings).append(problem)
+
+    return {"ok": not errors, "errors": errors, "warnings": warnings, "files": len(files),
+            "bytes": sum(sizes.values()), "js_checker": js_checker(), "seconds": round(time.perf_counter() - started, 4)}
+
+
+def validate_folder(folder: str) -> Dict:
+    """Reads a saved game folder (without the .gz/.br variants) and validates it."""
+    root = Path(folder)
+    if not root.is_dir():
+        return {"ok": False, "errors": [f"priečinok {root.name} neexistuje"], "warnings": [], "files": 0, "bytes": 0,
+                "js_checker": js_checker(), "seconds": 0.0}
+    files = {path.relative_to(root).as_posix(): path.read_text(encoding="utf-8", errors="replace")
+             for path in sorted(root.rglob("*")) if path.is_file() and not is_precompressed_variant(path)}
+    return validate_files(files)
+
+
+class GameValidator:
+    """Runs the checks in a process pool, so generating the next game never waits for them.
+
+    Games are submitted by folder as soon as they are written; result() picks the outcome up
+    later and validates on the spot games it never saw (e.g. after resuming from a checkpoint).
+    With workers=0 the checks run synchronously in the calling thread.
+    """
+
+    def __init__(self, workers: int = 2):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _run(self, fn: Callable, *args) -> Future:
+        if self.workers <= 0:
+            future: Future = Future()
+            future.set_result(fn(*args))
+            return future
+        if self._pool is None:
+            # spawn: forking a process that runs LangGraph/Streamlit threads is unsafe
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            return self._pool.submit(fn, *args)
+        except (BrokenProcessPool, RuntimeError): # A worker died (or the pool was shut down): start a fresh pool
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool.submit(fn, *args)
+
+    def submit_folder(self, folder: str) -> None:
+        with self._lock:
+            self._futures[folder] = self._run(validate_folder, folder)
+
+    def submit_files(self, folder: str, files: Dict[str, str]) -> None:
+        """Validates content that is about to be saved to `folder` (sequential, non-streaming worker)."""
+        with self._lock:
+            self._futures[folder] = self._run(validate_files, files)
+
+    def discard(self, folder: str) -> None:
+        """Drops a submitted check whose game was never saved (the content it checked is gone)."""
+        with self._lock:
+            future = self._futures.pop(folder, None)
+        if future is not None:
+            future.cancel()
+
+    def result(self, folder: str, timeout: float = GAME_VALIDATION_TIMEOUT_S) -> Dict:
+        """Waits for the result of `folder`, validating it now if it was never submitted.
+
+        ok is None when the check did not finish in time: the game is unchecked, neither passed nor failed.
+        """
+        with self._lock:
+            future = self._futures.pop(folder, None)
+            if future is None:
+                future = self._run(validate_folder, folder)
+        try:
+            return future.result(timeout=timeout)
+        except BrokenProcessPool:
+            return validate_folder(folder)
+        except FutureTimeoutError:
+            future.cancel()
+            return {"ok": None, "errors": [], "warnings": [f"kontrola nedobehla do {timeout:g} s"], "files": 0, "bytes": 0,
+                    "js_checker": js_checker(), "seconds": timeout}
+
+    def shutdown(self) -> None:
+        """Cancels queued checks and waits for the pool's processes to exit (running checks are bounded by their timeouts).
+
+        Not waiting leaves the spawn children behind, and a job worker process would then hang on exit joining them.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._futures.clear()
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
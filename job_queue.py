@@ -0,0 +1,248 @@
+# job_queue.py - Durable SQLite queue of theme-generation jobs, shared by the dashboard and job_worker processes
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+JOB_DB = Path(os.getenv("JOB_DB", ".jobs/jobs.sqlite3"))
+JOB_STALE_S = float(os.getenv("JOB_STALE_S", "120")) # A running job without a heartbeat for this long is requeued
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3")) # Claims per job before it is marked failed
+
+JOB_STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT, theme TEXT NOT NULL, priority INTEGER NOT NULL DEFAULT 0,"
+    " status TEXT NOT NULL DEFAULT 'queued', options TEXT NOT NULL DEFAULT '{}', run_id TEXT,"
+    " worker TEXT, attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, started_at REAL,"
+    " finished_at REAL, heartbeat_at REAL, result TEXT, error TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, priority DESC, id)",
+    "CREATE TABLE IF NOT EXISTS workers ("
+    " name TEXT PRIMARY KEY, pid INTEGER NOT NULL, host TEXT NOT NULL, started_at REAL NOT NULL,"
+    " heartbeat_at REAL NOT NULL, job_id INTEGER)",
+)
+
+
+def _run_id(job_id: int, created_at: float, retries: int = 0) -> str:
+    """Keys the checkpoint, metrics and log of a job; unique even if the queue file is recreated."""
+    run_id = f"job-{datetime.fromtimestamp(created_at, timezone.utc):%Y%m%d-%H%M%S}-{job_id}"
+    return f"{run_id}-r{retries}" if retries else run_id
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict:
+    job = dict(row)
+    job["options"] = json.loads(job["options"] or "{}")
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class JobQueue:
+    """Jobs ordered by priority (higher first), then submission order.
+
+    Every process opens its own JobQueue on the same file. State changes run in IMMEDIATE
+    transactions, so two workers never claim the same job; a worker that dies stops sending
+    heartbeats and its job is requeued (and resumed from the graph checkpoint) by the next claim.
+    """
+
+    def __init__(self, path: Path = JOB_DB, stale_s: float = JOB_STALE_S, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.stale_s = stale_s
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def submit(self, theme: str, priority: int = 0, **options) -> int:
+        """Queues one theme; options are passed to batch_runner.run_theme (concurrency, batch_size, ...)."""
+        now = time.time()
+        with self._transaction() as conn:
+            job_id = conn.execute("INSERT INTO jobs (theme, priority, options, created_at) VALUES (?, ?, ?, ?)",
+                                  (theme, priority, json.dumps(options), now)).lastrowid
+            conn.execute("UPDATE jobs SET run_id = ? WHERE id = ?", (_run_id(job_id, now), job_id))
+        return job_id
+
+    def requeue_stale(self) -> int:
+        """Requeues running jobs whose worker stopped sending heartbeats (fails them after max_attempts)."""
+        now = time.time()
+        with self._transaction() as conn:
+            return self._requeue_stale(conn, now)
+
+    def _requeue_stale(self, conn: sqlite3.Connection, now: float) -> int:
+        cutoff = now - self.stale_s
+        conn.execute("UPDATE jobs SET status = 'failed', finished_at = ?, error = 'Worker prestal odpovedať.'"
+                     " WHERE status = 'running' AND heartbeat_at < ? AND attempts >= ?", (now, cutoff, self.max_attempts))
+        return conn.execute("UPDATE jobs SET status = 'queued', worker = NULL"
+                            " WHERE status = 'running' AND heartbeat_at < ?", (cutoff,)).rowcount
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """Atomically takes the highest-priority queued job, or returns None when the queue is empty."""
+        now = time.time()
+        with self._transaction() as conn:
+            self._requeue_stale(conn, now)
+            row = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority DESC, id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, started_at = ?,"
+                         " heartbeat_at = ?, error = NULL WHERE id = ?", (worker, now, now, row["id"]))
+            conn.execute("UPDATE workers SET job_id = ?, heartbeat_at = ? WHERE name = ?", (row["id"], now, worker))
+            return _row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def heartbeat(self, job_id: int, worker: str) -> bool:
+        """Marks the job as alive; False if it no longer belongs to this worker (requeued meanwhile)."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("UPDATE workers SET heartbeat_at = ? WHERE name = ?", (now, worker))
+            return conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                                (now, job_id, worker)).rowcount == 1
+
+    def finish(self, job_id: int, result: Dict, error: Optional[str] = None) -> None:
+        """Stores the run summary; a run that ended with an error is failed, but keeps its partial result."""
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?",
+                         ("failed" if error else "done", time.time(), json.dumps(result, ensure_ascii=False), error, job_id))
+            conn.execute("UPDATE workers SET job_id = NULL WHERE job_id = ?", (job_id,))
+
+    def fail(self, job_id: int, error: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?", (time.time(), error, job_id))
+            conn.execute("UPDATE workers SET job_id = NULL WHERE job_id = ?", (job_id,))
+
+    def requeue(self, job_id: int) -> None:
+        """Puts an interrupted job back; the next claim resumes it from its checkpoint."""
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE id = ? AND status = 'running'", (job_id,))
+            conn.execute("UPDATE workers SET job_id = NULL WHERE job_id = ?", (job_id,))
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancels a job that has not started yet; running jobs finish normally."""
+        with self._transaction() as conn:
+            return conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                                (time.time(), job_id)).rowcount == 1
+
+    def retry(self, job_id: int) -> bool:
+        """Queues a failed or cancelled job again as a fresh run that reuses every game already saved.
+
+        A new run id, because the old checkpoint may already be at the end of the graph (a run with
+        failed games); reuse_existing skips the LLM for unchanged games via the workspace manifest.
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT options, created_at FROM jobs WHERE id = ? AND status IN ('failed', 'cancelled')",
+                               (job_id,)).fetchone()
+            if row is None:
+                return False
+            options = json.loads(row["options"])
+            options.update(reuse_existing=True, retries=options.get("retries", 0) + 1)
+            conn.execute("UPDATE jobs SET status = 'queued', options = ?, run_id = ?, worker = NULL, attempts = 0,"
+                         " finished_at = NULL, error = NULL WHERE id = ?",
+                         (json.dumps(options), _run_id(job_id, row["created_at"], options["retries"]), job_id))
+            return True
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return _row_to_job(rows[0]) if rows else None
+
+    def list(self, statuses: Optional[List[str]] = None, limit: int = 100) -> List[Dict]:
+        """Newest jobs first, without the (possibly large) result column."""
+        where = f"WHERE status IN ({', '.join('?' * len(statuses))})" if statuses else ""
+        rows = self._query(f"SELECT id, theme, priority, status, options, run_id, worker, attempts, created_at, started_at,"
+                           f" finished_at, heartbeat_at, NULL AS result, error FROM jobs {where} ORDER BY id DESC LIMIT ?",
+                           (*(statuses or ()), limit))
+        return [_row_to_job(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        counts.update({row["status"]: row["n"] for row in self._query("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")})
+        return counts
+
+    def register_worker(self, name: str) -> None:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO workers (name, pid, host, started_at, heartbeat_at, job_id)"
+                         " VALUES (?, ?, ?, ?, ?, NULL)", (name, os.getpid(), socket.gethostname(), now, now))
+
+    def beat_worker(self, name: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("UPDATE workers SET heartbeat_at = ? WHERE name = ?", (time.time(), name))
+
+    def unregister_worker(self, name: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM workers WHERE name = ?", (name,))
+
+    def workers(self, alive_only: bool = True) -> List[Dict]:
+        """Registered worker processes; `alive_only` drops those without a recent heartbeat."""
+        cutoff = time.time() - self.stale_s if alive_only else 0
+        return [dict(row) for row in self._query("SELECT * FROM workers WHERE heartbeat_at >= ? ORDER BY name", (cutoff,))]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m job_queue", description="Fronta tém na generovanie hier.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="Zaradí témy zo súboru (jedna na riadok) do fronty.")
+    submit.add_argument("themes_file", type=Path)
+    submit.add_argument("-p", "--priority", type=int, default=0, help="Vyššia priorita sa spracuje skôr.")
+    submit.add_argument("-c", "--concurrency", type=int, default=None, help="Počet hier generovaných naraz.")
+    submit.add_argument("-b", "--batch-size", type=int, default=None, help="Počet hier v jednom LLM volaní.")
+    submit.add_argument("--regenerate", action="store_true", help="Pregeneruje aj hry, ktoré sa podľa manifestu nezmenili.")
+    status = commands.add_parser("status", help="Vypíše stav fronty a workerov.")
+    status.add_argument("-n", "--limit", type=int, default=20)
+    cancel = commands.add_parser("cancel", help="Zruší úlohy, ktoré ešte nezačali.")
+    cancel.add_argument("job_ids", type=int, nargs="+")
+    retry = commands.add_parser("retry", help="Znova zaradí zlyhané alebo zrušené úlohy (nový beh, hotové hry sa použijú znova).")
+    retry.add_argument("job_ids", type=int, nargs="+")
+    args = parser.parse_args(argv)
+
+    queue = JobQueue()
+    if args.command == "submit":
+        from batch_runner import read_themes # Lazy: pulls in the whole pipeline
+        options = {"reuse_existing": not args.regenerate}
+        if args.concurrency is not None:
+            options["concurrency"] = args.concurrency
+        if args.batch_size is not None:
+            options["batch_size"] = args.batch_size
+        job_ids = [queue.submit(theme, args.priority, **options) for theme in read_themes(args.themes_file)]
+        print(f"Zaradených {len(job_ids)} úloh: {', '.join(map(str, job_ids))}", file=sys.stderr)
+    elif args.command == "status":
+        print(json.dumps({"counts": queue.counts(), "workers": queue.workers(), "jobs": queue.list(limit=args.limit)},
+                         ensure_ascii=False, indent=2))
+    elif args.command == "cancel":
+        for job_id in args.job_ids:
+            print(f"{job_id}: {'zrušená' if queue.cancel(job_id) else 'už beží alebo skončila'}", file=sys.stderr)
+    else:
+        for job_id in args.job_ids:
+            print(f"{job_id}: {'znova vo fronte' if queue.retry(job_id) else 'nie je zlyhaná ani zrušená'}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
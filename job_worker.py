@@ -0,0 +1,125 @@
+# job_worker.py - Worker processes draining the job queue: python -m job_worker --processes 2
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+from job_queue import JOB_DB, JobQueue
+
+JOB_POLL_S = float(os.getenv("JOB_POLL_S", "2")) # Pause between claims while the queue is empty
+JOB_HEARTBEAT_S = float(os.getenv("JOB_HEARTBEAT_S", "10")) # Must stay well below JOB_STALE_S
+JOB_WORKER_LOG = Path(os.getenv("EVENT_LOG_DIR", ".logs")) / "job_worker.log"
+RATE_LIMIT_DB = JOB_DB.parent / "rate_limit.sqlite3" # Default GEMINI_RATE_LIMIT_DB for worker processes
+
+
+def _heartbeat(queue: JobQueue, name: str, current: dict, stop: threading.Event) -> None:
+    while not stop.wait(JOB_HEARTBEAT_S):
+        try:
+            job_id = current.get("job_id")
+            if job_id is None:
+                queue.beat_worker(name)
+            elif not queue.heartbeat(job_id, name):
+                logging.warning("Úloha %s už nepatrí workerovi %s (vrátená do fronty)", job_id, name)
+        except Exception:
+            logging.exception("Heartbeat workera %s zlyhal", name)
+
+
+def worker_loop(exit_when_empty: bool = False) -> None:
+    """Body of one worker process: builds app_graph once, then runs claimed jobs one after another."""
+    import batch_runner # After GEMINI_RATE_LIMIT_DB is set: the pipeline picks its rate limiter at import
+    import game_pipeline
+
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s %(levelname)s [{os.getpid()}] %(message)s")
+    name = f"{socket.gethostname()}-{os.getpid()}"
+    queue = JobQueue()
+    queue.register_worker(name)
+    graph = game_pipeline.build_graph(checkpointer=game_pipeline.open_checkpointer())
+    current = {}
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(queue, name, current, stop), name="job-heartbeat", daemon=True).start()
+    logging.info("Worker %s pripravený", name)
+    try:
+        while True:
+            job = queue.claim(name)
+            if job is None:
+                if exit_when_empty:
+                    return
+                time.sleep(JOB_POLL_S)
+                continue
+            current["job_id"] = job["id"]
+            options = job["options"]
+            logging.info("Úloha %s: '%s' (pokus %s, run %s)", job["id"], job["theme"], job["attempts"], job["run_id"])
+            try:
+                # resume=True: a job requeued after a crash continues from its last checkpoint
+                result = batch_runner.run_theme(
+                    graph, job["theme"], job["run_id"], options.get("concurrency", game_pipeline.MAX_CONCURRENT_WORKERS),
+                    resume=True, reuse_existing=options.get("reuse_existing", game_pipeline.REUSE_UNCHANGED_GAMES),
+                    archive_format=options.get("archive_format"),
+                    batch_size=options.get("batch_size", game_pipeline.WORKER_BATCH_SIZE))
+                queue.finish(job["id"], result, result["error"])
+                logging.info("Úloha %s hotová: %s hier za %.1f s", job["id"], result["games_saved"], result["seconds"])
+            except KeyboardInterrupt:
+                queue.requeue(job["id"])
+                raise
+            except Exception as e:
+                logging.exception("Úloha %s zlyhala", job["id"])
+                queue.fail(job["id"], str(e))
+            finally:
+                current.pop("job_id", None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        queue.unregister_worker(name)
+        game_pipeline.validator.shutdown()
+
+
+def run_workers(processes: int, exit_when_empty: bool = False) -> int:
+    """Starts `processes` worker processes sharing one Gemini rate limit and waits for them."""
+    os.environ.setdefault("GEMINI_RATE_LIMIT_DB", str(RATE_LIMIT_DB))
+    if processes <= 1:
+        worker_loop(exit_when_empty)
+        return 0
+    context = multiprocessing.get_context("spawn")
+    children: List[multiprocessing.Process] = [
+        context.Process(target=worker_loop, args=(exit_when_empty,), name=f"job-worker-{i}") for i in range(processes)]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        # Ctrl+C reaches the whole process group; children requeue their jobs and exit
+        for child in children:
+            child.join()
+    return max((child.exitcode or 0) for child in children)
+
+
+def launch_detached(processes: int) -> subprocess.Popen:
+    """Starts `python -m job_worker` in the background, independent of the calling process (the dashboard)."""
+    JOB_WORKER_LOG.parent.mkdir(parents=True, exist_ok=True)
+    with open(JOB_WORKER_LOG, "ab") as log:
+        kwargs = ({"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.DETACHED_PROCESS}
+                  if sys.platform == "win32" else {"start_new_session": True})
+        return subprocess.Popen([sys.executable, "-m", "job_worker", "--processes", str(processes)],
+                                cwd=Path(__file__).resolve().parent, stdin=subprocess.DEVNULL, stdout=log,
+                                stderr=subprocess.STDOUT, **kwargs)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m job_worker", description="Spracúva úlohy z fronty tém.")
+    parser.add_argument("-p", "--processes", type=int, default=2, help="Počet worker procesov.")
+    parser.add_argument("--exit-when-empty", action="store_true", help="Skončí, keď vo fronte nič nečaká.")
+    args = parser.parse_args(argv)
+    return run_workers(args.processes, args.exit_when_empty)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# llm_backends.py - Pluggable model backends: real Gemini or a local simulated one
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional, Protocol
+
+BACKENDS = ("gemini", "fake")
+
+
+class GenerativeBackend(Protocol):
+    """The subset of genai.GenerativeModel the pipeline uses."""
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs): ...
+
+
+def create_model(backend: str, model_name: str, generation_config: Optional[Dict] = None) -> GenerativeBackend:
+    """Returns a model object for the given backend name ("gemini" or "fake")."""
+    if backend == "fake":
+        return FakeGeminiModel.from_env()
+    if backend != "gemini":
+        raise ValueError(f"Neznámy LLM backend '{backend}', povolené: {', '.join(BACKENDS)}")
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise RuntimeError("Google API kľúč nenájdený. Prosím, uistite sa, že GOOGLE_API_KEY je nastavený vo vašom .env súbore.")
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(model_name, generation_config=generation_config or None)
+
+
+# --- Simulated Gemini ---
+class FakeRateLimitError(Exception):
+    """Mimics google.api_core ResourceExhausted; call_llm recognises it by the '429' in the message."""
+
+
+class LatencyDistribution:
+    """Parses specs like 'fixed:0.2', 'uniform:0.1,0.5', 'normal:1.0,0.2' or 'lognormal:0.5,0.4' (seconds)."""
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip()
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        if self.kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Neznáme rozdelenie latencie '{spec}'")
+        self.spec = spec
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(self.params[0], self.params[1])
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(self.params[0], self.params[1]))
+        # lognormal: params are the median in seconds and sigma of the underlying normal
+        median, sigma = self.params
+        return median * rng.lognormvariate(0.0, sigma)
+
+
+class FakeResponse:
+    def __init__(self, text: str, prompt_tokens: int):
+        self.text = text
+        self.usage_metadata = _usage(prompt_tokens, len(text) // 4)
+
+
+class FakeStreamResponse:
+    """Iterable of chunks like genai's streamed response; usage_metadata is filled once iteration ends."""
+
+    def __init__(self, text: str, prompt_tokens: int, chunk_chars: int, chunk_delay: float):
+        self._text = text
+        self._prompt_tokens = prompt_tokens
+        self._chunk_chars = chunk_chars
+        self._chunk_delay = chunk_delay
+        self.usage_metadata = None
+
+    def __iter__(self) -> Iterator[SimpleNamespace]:
+        for start in range(0, len(self._text), self._chunk_chars):
+            if self._chunk_delay:
+                time.sleep(self._chunk_delay)
+            yield SimpleNamespace(text=self._text[start:start + self._chunk_chars])
+        self.usage_metadata = _usage(self._prompt_tokens, len(self._text) // 4)
+
+
+def _usage(prompt_tokens: int, output_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=output_tokens,
+                           total_token_count=prompt_tokens + output_tokens)
+
+
+class FakeGeminiModel:
+    """Local stand-in for genai.GenerativeModel with configurable latency, failures and payload size.
+
+    Planner prompts ("Vytvor zoznam N ...") get N concept names, batched worker prompts (games
+    listed as ID "gN") get an object keyed by those IDs, and every other prompt gets a multi-file
+    game payload of roughly `payload_bytes` per game. Responses are deterministic per prompt.
+    """
+
+    def __init__(self, latency: str = "lognormal:0.05,0.5", rate_limit_rate: float = 0.0,
+                 malformed_rate: float = 0.0, payload_bytes: int = 6000, stream_chunk_chars: int = 400,
+                 seed: int = 0):
+        self.latency = LatencyDistribution(latency)
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.payload_bytes = payload_bytes
+        self.stream_chunk_chars = stream_chunk_chars
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.injected_429 = 0
+        self.injected_malformed = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeGeminiModel":
+        return cls(
+            latency=os.getenv("FAKE_LLM_LATENCY", "lognormal:0.05,0.5"),
+            rate_limit_rate=float(os.getenv("FAKE_LLM_429_RATE", "0")),
+            malformed_rate=float(os.getenv("FAKE_LLM_MALFORMED_RATE", "0")),
+            payload_bytes=int(os.getenv("FAKE_LLM_PAYLOAD_BYTES", "6000")),
+            seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+        )
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            latency = self.latency.sample(self._rng)
+            fail_429 = self._rng.random() < self.rate_limit_rate
+            malformed = self._rng.random() < self.malformed_rate
+            if fail_429:
+                self.injected_429 += 1
+            elif malformed:
+                self.injected_malformed += 1
+        if fail_429:
+            time.sleep(min(latency, 0.05))
+            raise FakeRateLimitError("429 Resource has been exhausted (simulated).")
+        text = self._respond(prompt)
+        if malformed:
+            text = self._corrupt(text, prompt)
+        prompt_tokens = max(1, len(prompt) // 4)
+        if stream:
+            chunks = max(1, len(text) // self.stream_chunk_chars)
+            time.sleep(latency / 2) # Time to first token; the rest is spread over the chunks
+            return FakeStreamResponse(text, prompt_tokens, self.stream_chunk_chars, latency / 2 / chunks)
+        time.sleep(latency)
+        return FakeResponse(text, prompt_tokens)
+
+    def _respond(self, prompt: str) -> str:
+        match = re.search(r"zoznam (\d+)", prompt)
+        if match:
+            count = int(match.group(1))
+            return json.dumps([f"Simulovaná hra {i + 1}" for i in range(count)], ensure_ascii=False)
+        batch_ids = re.findall(r'ID "(g\d+)"', prompt)
+        if batch_ids:
+            return "```json\n" + json.dumps({game_id: self._game_files(prompt + game_id) for game_id in batch_ids}, ensure_ascii=False) + "\n```"
+        return "```json\n" + json.dumps(self._game_files(prompt), ensure_ascii=False) + "\n```"
+
+    def _game_files(self, seed_text: str) -> List[Dict[str, str]]:
+        digest = hashlib.sha256(seed_text.encode("utf-8")).hexdigest()[:12]
+        body = "".join(f'<div class="tile t{i}">{digest}</div>\n' for i in range(max(1, self.payload_bytes // 3 // 40)))
+        return [
+            {"filename": "index.html", "content": f'<!DOCTYPE html>\n<html><head><link rel="stylesheet" href="style.css"></head>\n<body>\n{body}<script src="script.js"></script>\n</body></html>\n'},
+            {"filename": "style.css", "content": "".join(f".t{i} {{ color: #{i % 4096:03x}; animation: pop {i % 7 + 1}s infinite; }}\n" for i in range(max(1, self.payload_bytes // 3 // 55)))},
+            {"filename": "script.js", "content": "".join(f"document.querySelectorAll('.t{i}').forEach(el => el.onclick = () => el.classList.toggle('on'));\n" for i in range(max(1, self.payload_bytes // 3 // 85)))},
+        ]
+
+    def _corrupt(self, text: str, prompt: str) -> str:
+        """Damages a response the way real LLM output tends to break."""
+        variant = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16) % 4
+        if variant == 0: # Truncated in the middle of the last file
+            return text[: int(len(text) * 0.8)]
+        if variant == 1: # Trailing comma and chatter after the fence
+            return text.replace("}]", "},]", 1) + "\nDúfam, že sa vám hra páči!"
+        if variant == 2: # Raw newlines inside strings
+            return text.replace("\\n", "\n")
+        return "Tu sú súbory:\n" + text # Prose before the fence
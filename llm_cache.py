@@ -0,0 +1,125 @@
+# llm_cache.py - Persistent content-addressed cache for LLM responses
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+CACHE_MODES = ("off", "readwrite", "replay")
+
+
+class CacheMiss(Exception):
+    """Raised in replay mode when a prompt has no cached response."""
+
+
+def make_cache_key(model_name: str, prompt: str, generation_config: Optional[Dict] = None) -> str:
+    """SHA-256 over everything that influences the model's answer."""
+    payload = json.dumps(
+        {"model": model_name, "prompt": prompt, "config": generation_config or {}},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed response cache with size-based LRU eviction and a TTL.
+
+    Modes:
+      - "off": never read or write.
+      - "readwrite": serve hits, store new responses.
+      - "replay": serve hits only; a miss raises CacheMiss (offline CI / benchmarks).
+    """
+
+    def __init__(self, path: Path, mode: str = "readwrite", max_bytes: int = 512 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = 30 * 24 * 3600):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Neznámy režim cache '{mode}', povolené: {', '.join(CACHE_MODES)}")
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if mode != "off":
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+            self._conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached response or None; raises CacheMiss on a miss in replay mode.
+
+        Replay mode treats the cache as a read-only fixture: no TTL expiry, no deletes, no access updates.
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and self.mode != "replay" and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if row is not None and self.mode != "replay":
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+        if row is None and self.mode == "replay":
+            raise CacheMiss(f"Odpoveď pre kľúč {key[:12]}… nie je v cache (režim replay).")
+        return row[0] if row else None
+
+    def put(self, key: str, response: str) -> None:
+        """Stores a response (no-op outside readwrite mode) and evicts least recently used entries."""
+        if self.mode != "readwrite":
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.ttl_seconds is not None:
+            cursor = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self.evictions += cursor.rowcount
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+            if total - freed <= self.max_bytes:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters for this process plus the current on-disk size."""
+        entries, size = 0, 0
+        if self.enabled:
+            with self._lock:
+                entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": entries, "bytes": size}
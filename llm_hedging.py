@@ -0,0 +1,140 @@
+# llm_hedging.py - Hedged LLM requests: a duplicate after an adaptive delay, first answer wins, hard deadline
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from metrics import percentile
+from rate_limiter import TokenBucket
+
+T = TypeVar("T")
+
+
+class LLMTimeoutError(TimeoutError):
+    """No attempt of a call answered within the hard per-call timeout."""
+
+
+@dataclass
+class HedgeOutcome:
+    hedged: bool = False # A duplicate request was sent
+    hedge_won: bool = False # ...and answered first
+    threshold_s: Optional[float] = None # Delay after which the duplicate would be sent
+
+
+class LatencyTracker:
+    """Latencies of the most recent completed requests of one kind."""
+
+    def __init__(self, window: int = 50):
+        self._values: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._values.append(seconds)
+
+    def quantile(self, pct: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            values = list(self._values)
+        return percentile(values, pct) if len(values) >= min_samples else None
+
+
+def _spawn(fn: Callable[[], T]) -> "Future[T]":
+    """Runs fn on its own daemon thread; a request that is no longer needed just finishes in the background."""
+    future: Future = Future()
+    context = contextvars.copy_context()
+
+    def run() -> None:
+        # Done-callbacks run inside set_result, so they see the caller's context (current run, game) too
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=context.run, args=(run,), name="llm-request", daemon=True).start()
+    return future
+
+
+class Hedger:
+    """Sends a second identical request when the first is slower than the running p-th percentile.
+
+    The duplicate is limited by `max_rate` (share of recent calls that may be hedged) and by
+    `budget_per_minute` (extra requests per minute, 0 disables hedging). A blocking HTTP call cannot be cancelled,
+    so the losing request is ignored. `timeout_s` is a hard deadline for the whole call.
+    """
+
+    def __init__(self, enabled: bool = False, pct: float = 90, min_samples: int = 8, max_rate: float = 0.1,
+                 budget_per_minute: float = 5, timeout_s: Optional[float] = None, window: int = 100):
+        self.enabled = enabled and budget_per_minute > 0 # A zero budget means no duplicates at all
+        self.pct = pct
+        self.min_samples = min_samples
+        self.max_rate = max_rate
+        self.timeout_s = timeout_s
+        self._budget = TokenBucket(max(budget_per_minute, 0), max(budget_per_minute, 0) / 60.0)
+        self._decisions: Deque[bool] = deque(maxlen=window)
+        self._trackers: Dict[str, LatencyTracker] = {}
+        self._lock = threading.Lock()
+
+    def tracker(self, kind: str) -> LatencyTracker:
+        with self._lock:
+            return self._trackers.setdefault(kind, LatencyTracker())
+
+    def _may_hedge(self, reserve_hedge: Callable[[], bool]) -> bool:
+        """Checks the rate and budget, then reserve_hedge(); the budget is only spent when both allow the duplicate."""
+        with self._lock:
+            hedged = sum(self._decisions)
+            if hedged + 1 > self.max_rate * (len(self._decisions) + 1) or self._budget.wait_time(1) > 0:
+                return False
+        if not reserve_hedge(): # Outside the lock: it may wait on the shared rate-limit database
+            return False
+        with self._lock:
+            self._budget.consume(1) # A concurrent hedge may have taken the last unit; the bucket records the debt
+        return True
+
+    def call(self, kind: str, attempt: Callable[[], T], reserve_hedge: Callable[[], bool] = lambda: True,
+             on_saving: Optional[Callable[[float], None]] = None) -> Tuple[T, HedgeOutcome]:
+        """Runs attempt() (twice if hedged) and returns the first successful result.
+
+        `reserve_hedge` is asked right before a duplicate is sent (e.g. a non-blocking rate-limit
+        check); `on_saving` later receives the seconds saved if the duplicate won and the original
+        request eventually finished.
+        """
+        started = time.perf_counter()
+        deadline = started + self.timeout_s if self.timeout_s else None
+        tracker = self.tracker(kind)
+        primary = _spawn(attempt)
+        # Every successful original request feeds the threshold, including ones a hedge overtook
+        primary.add_done_callback(lambda f: f.exception() is None and tracker.add(time.perf_counter() - started))
+        futures = [primary]
+        outcome = HedgeOutcome(threshold_s=tracker.quantile(self.pct, self.min_samples) if self.enabled else None)
+        if outcome.threshold_s is not None:
+            first_wait = outcome.threshold_s if deadline is None else min(outcome.threshold_s, deadline - started)
+            done, _ = wait([primary], timeout=first_wait)
+            if not done and (deadline is None or time.perf_counter() < deadline) and self._may_hedge(reserve_hedge):
+                outcome.hedged = True
+                futures.append(_spawn(attempt))
+        with self._lock:
+            self._decisions.append(outcome.hedged)
+
+        pending = set(futures)
+        error: Optional[BaseException] = None
+        while pending:
+            remaining = None if deadline is None else deadline - time.perf_counter()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                outcome.hedge_won = future is not primary
+                if outcome.hedge_won and on_saving is not None:
+                    won_after = time.perf_counter() - started
+                    # Only an original that eventually succeeded shows how long the call would have taken
+                    primary.add_done_callback(lambda f: f.exception() is None and on_saving(time.perf_counter() - started - won_after))
+                return future.result(), outcome
+        if error is not None and not pending:
+            raise error
+        raise LLMTimeoutError(f"LLM neodpovedalo do {self.timeout_s:g} s.")
@@ -0,0 +1,208 @@
+# llm_json.py - Helpers for parsing JSON produced by the LLM
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+
+class JsonArrayStreamParser:
+    """Incrementally extracts the top-level objects of a JSON array that arrives in chunks.
+
+    Anything before the opening '[' (e.g. a ```json fence) and after the closing ']' is ignored.
+    Each object is decoded with json.loads as soon as its closing brace arrives and its text is then
+    dropped, so only the object currently being received is held. Once an object fails to decode,
+    extraction stops and the text from that object on is kept instead; unparsed_text() hands it
+    (with the text before the array) to salvage_json.
+    """
+
+    def __init__(self):
+        self.started = False # Seen the opening '['
+        self.finished = False # Seen the closing ']'
+        self.failed = False # An object did not decode; later chunks are only kept
+        self._depth = 0 # Nesting depth inside the current top-level object
+        self._in_string = False
+        self._escape = False
+        self._head: List[str] = [] # Text up to and including the opening '['
+        self._parts: List[str] = [] # Text of the current object received in earlier chunks (all text once failed)
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Consumes a chunk of text and returns the objects completed by it."""
+        if self.failed:
+            self._parts.append(chunk)
+            return []
+        completed = []
+        start = 0 if self._depth else None # Offset of the current object within this chunk
+        for i, ch in enumerate(chunk):
+            if self.finished:
+                break
+            if self._depth == 0:
+                if not self.started:
+                    if ch == "[":
+                        self.started = True
+                        self._head.append(chunk[:i + 1])
+                elif ch == "{":
+                    self._depth = 1
+                    start = i
+                elif ch == "]":
+                    self.finished = True
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[start:i + 1])
+                    text = "".join(self._parts)
+                    try:
+                        completed.append(json.loads(text))
+                    except json.JSONDecodeError:
+                        self.failed = True
+                        self._parts = [text, chunk[i + 1:]]
+                        return completed
+                    self._parts = []
+                    start = None
+        if not self.started:
+            self._head.append(chunk)
+        elif self._depth and start is not None:
+            self._parts.append(chunk[start:])
+        return completed
+
+    def unparsed_text(self) -> str:
+        """The text before the array plus everything from the failed or unfinished object on."""
+        return "".join(self._head) + "".join(self._parts)
+
+
+# --- Salvage of malformed JSON ---
+REPAIR_RULES = ("code_fence", "leading_text", "trailing_text", "control_chars",
+                "inner_quotes", "trailing_commas", "truncated_array", "truncated_object")
+
+
+class TruncatedJsonError(ValueError):
+    """The response stops inside its JSON value (e.g. the output token limit) before any element was complete."""
+
+
+_FENCE_RE = re.compile(r"```[a-zA-Z]*[ \t]*\n?(.*?)(?:```|$)", re.DOTALL)
+
+
+def strip_code_fences(text: str) -> str:
+    """Returns the body of the first ``` fenced block found anywhere in the text, or the text itself."""
+    match = _FENCE_RE.search(text)
+    return match.group(1).strip() if match else text.strip()
+
+
+def _closes_string(text: str, i: int) -> bool:
+    """Decides whether the quote at text[i] ends a JSON string or is an unescaped quote inside it."""
+    j = i + 1
+    while j < len(text) and text[j] in " \t\r\n":
+        j += 1
+    if j >= len(text) or text[j] in "}]:":
+        return True
+    if text[j] != ",":
+        return False
+    j += 1
+    while j < len(text) and text[j] in " \t\r\n":
+        j += 1
+    # After a real closing quote and comma, JSON continues with another value or key
+    return j >= len(text) or text[j] in '"{[]}-0123456789tfn'
+
+
+def _repair(text: str, fired: List[str]) -> Tuple[str, bool]:
+    """Single pass that escapes bad characters in strings, drops trailing commas and closes truncated arrays and objects.
+
+    Returns the repaired text and whether the input ended inside the top-level value.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = escape = False
+    last_complete = None # Length of `out` after the last complete top-level array element or object member
+    in_value = False # Inside a top-level object: past the member's ':', so a closing string is its value
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+                out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == '"':
+                if _closes_string(text, i):
+                    in_string = False
+                    out.append(ch)
+                    if len(stack) == 1 and (stack[0] == "[" or in_value):
+                        last_complete = len(out)
+                else:
+                    fired.append("inner_quotes")
+                    out.append('\\"')
+            elif ch in "\n\r\t":
+                fired.append("control_chars")
+                out.append({"\n": "\\n", "\r": "\\r", "\t": "\\t"}[ch])
+            else:
+                out.append(ch)
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            while out and out[-1] in " \t\r\n":
+                out.pop()
+            if out and out[-1] == ",":
+                fired.append("trailing_commas")
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                if text[i + 1:].strip():
+                    fired.append("trailing_text")
+                return "".join(out), False
+            if len(stack) == 1:
+                last_complete = len(out)
+        else:
+            if len(stack) == 1 and ch in ":,":
+                if ch == "," and (stack[0] == "[" or in_value):
+                    last_complete = len(out) # Also ends numbers and literals
+                in_value = ch == ":"
+            out.append(ch)
+        i += 1
+    if stack and last_complete is not None:
+        fired.append("truncated_array" if stack[0] == "[" else "truncated_object")
+        kept = "".join(out[:last_complete]).rstrip().rstrip(",")
+        return kept + ("]" if stack[0] == "[" else "}"), True
+    return "".join(out), bool(stack)
+
+
+def salvage_json(text: str) -> Tuple[Any, List[str]]:
+    """Tries to recover a JSON value from a malformed LLM response without asking for it again.
+
+    Returns (value, rules_fired). Raises ValueError when the text cannot be repaired, TruncatedJsonError
+    when it was cut off too early to keep anything. Every complete element of a truncated array and
+    every complete member of a truncated object is kept; the incomplete tail is dropped.
+    """
+    fired: List[str] = []
+    payload = text
+    if "```" in payload:
+        fired.append("code_fence")
+        payload = strip_code_fences(payload)
+    starts = [pos for pos in (payload.find("["), payload.find("{")) if pos != -1]
+    if not starts:
+        raise ValueError("V odpovedi sa nenašlo žiadne JSON pole ani objekt.")
+    if payload[:min(starts)].strip():
+        fired.append("leading_text")
+    repaired, truncated = _repair(payload[min(starts):], fired)
+    try:
+        value = json.loads(repaired)
+    except json.JSONDecodeError as e:
+        raise (TruncatedJsonError if truncated else ValueError)(f"JSON sa nepodarilo opraviť: {e}") from e
+    return value, sorted(set(fired))
@@ -0,0 +1,395 @@
+# metrics.py - Per-run instrumentation: node wall time, LLM latency, retries, tokens and cost
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+METRICS_DIR = Path(os.getenv("METRICS_DIR", ".metrics"))
+# USD per million tokens, used for the cost estimate (defaults: Gemini 2.5 Pro list price, prompts <= 200k tokens)
+PRICE_INPUT_PER_MTOK = float(os.getenv("GEMINI_PRICE_INPUT_PER_MTOK", "1.25"))
+PRICE_OUTPUT_PER_MTOK = float(os.getenv("GEMINI_PRICE_OUTPUT_PER_MTOK", "10.0"))
+
+PER_GAME_NODES = ("worker", "validate", "save_and_log", "worker_task", "repair_game")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "total_s": round(sum(values), 4),
+        "p50_s": round(percentile(values, 50), 4),
+        "p90_s": round(percentile(values, 90), 4),
+        "p99_s": round(percentile(values, 99), 4),
+        "max_s": round(max(values), 4) if values else 0.0,
+    }
+
+
+@dataclass
+class LLMCallRecord:
+    kind: str # "call" (call_llm) or "stream" (stream_game_files)
+    game_index: Optional[int] = None # 0-based index in game_plan, None for planner calls
+    latency_s: float = 0.0 # Wall time of the whole call including retries and rate-limit waits
+    rate_limit_wait_s: float = 0.0
+    retries: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    cached_prompt_tokens: int = 0 # Prompt tokens the provider served from its prefix cache (cached_content_token_count)
+    cached: bool = False
+    ok: bool = True
+    hedged: bool = False # A duplicate request was sent because this one was slow (llm_hedging)
+    hedge_won: bool = False
+    timed_out: bool = False # Hit LLM_TIMEOUT_S at least once
+    json_repairs: List[str] = field(default_factory=list) # llm_json.salvage_json rules that fixed the response
+
+
+@dataclass
+class RunMetrics:
+    """Everything measured during one graph run; safe to update from concurrent worker threads."""
+    run_id: str
+    model: str = ""
+    started_at: float = field(default_factory=time.time)
+    nodes: List[Dict] = field(default_factory=list) # {"node", "game_index", "seconds"}
+    llm_calls: List[LLMCallRecord] = field(default_factory=list)
+    game_names: Dict[int, str] = field(default_factory=dict)
+    reused_games: List[int] = field(default_factory=list) # Games taken from the workspace manifest without an LLM call
+    batches: List[Dict] = field(default_factory=list) # One entry per batched worker call (see record_batch)
+    hedge_savings: List[float] = field(default_factory=list) # Seconds a winning hedge beat the original request by
+    validations: List[Dict] = field(default_factory=list) # {"ok", "repair", "seconds"} per game check (see record_validation)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_node(self, node: str, seconds: float, game_index: Optional[int] = None) -> None:
+        with self._lock:
+            self.nodes.append({"node": node, "game_index": game_index, "seconds": seconds})
+
+    def record_llm_call(self, record: LLMCallRecord) -> None:
+        with self._lock:
+            self.llm_calls.append(record)
+
+    def record_reused_game(self, game_index: Optional[int]) -> None:
+        with self._lock:
+            self.reused_games.append(game_index)
+
+    def record_batch(self, batch: Dict) -> None:
+        with self._lock:
+            self.batches.append(batch)
+
+    def record_hedge_saving(self, seconds: float) -> None:
+        with self._lock:
+            self.hedge_savings.append(seconds)
+
+    def hedging(self) -> Dict:
+        """Duplicate requests sent by llm_hedging, what they cost and how much latency they saved.
+
+        The ignored request is billed like the one that answered, so the extra spend is estimated from
+        the tokens of hedged calls. Latency saved only counts originals that finished before the report.
+        """
+        with self._lock:
+            calls, savings = list(self.llm_calls), list(self.hedge_savings)
+        hedged = [c for c in calls if c.hedged]
+        extra_prompt = sum(c.prompt_tokens for c in hedged)
+        extra_output = sum(c.output_tokens for c in hedged)
+        return {
+            "hedged_calls": len(hedged),
+            "hedge_wins": sum(1 for c in hedged if c.hedge_won),
+            "timeouts": sum(1 for c in calls if c.timed_out),
+            "extra_prompt_tokens_est": extra_prompt,
+            "extra_output_tokens_est": extra_output,
+            "extra_cost_usd_est": round(extra_prompt / 1e6 * PRICE_INPUT_PER_MTOK + extra_output / 1e6 * PRICE_OUTPUT_PER_MTOK, 4),
+            "latency_saved_s": round(sum(savings), 3),
+        }
+
+    def record_validation(self, check: Dict) -> None:
+        with self._lock:
+            self.validations.append(check)
+
+    def validation(self) -> Dict:
+        """Game checks: how many failed, how many a repair call fixed, how many timed out unchecked and the CPU time the checks took (off the worker path)."""
+        with self._lock:
+            checks = list(self.validations)
+        first = [c for c in checks if not c["repair"]]
+        repairs = [c for c in checks if c["repair"]]
+        return {
+            "checked": len(first),
+            "failed": sum(1 for c in first if c["ok"] is False),
+            "repaired": sum(1 for c in repairs if c["ok"] is True),
+            "still_failing": sum(1 for c in repairs if c["ok"] is False),
+            "unchecked": sum(1 for c in checks if c["ok"] is None), # Timed out (GAME_VALIDATION_TIMEOUT_S)
+            "check_s": round(sum(c["seconds"] for c in checks), 3),
+        }
+
+    def batching(self) -> Dict:
+        """Batched worker calls against what per-game mode would have sent for the same games.
+
+        Token figures use the same estimate (estimate_tokens) on both sides; measured totals are in "llm".
+        """
+        with self._lock:
+            batches = list(self.batches)
+        games = sum(b["games"] for b in batches)
+        fallbacks = games - sum(b["generated"] for b in batches)
+        return {
+            "batch_calls": len(batches),
+            "games": games,
+            "fallback_calls": fallbacks,
+            "requests": len(batches) + fallbacks,
+            "per_game_requests": games,
+            "prompt_tokens_est": sum(b["prompt_tokens_est"] + b["fallback_prompt_tokens_est"] for b in batches),
+            "per_game_prompt_tokens_est": sum(b["per_game_prompt_tokens_est"] for b in batches),
+        }
+
+    def name_game(self, game_index: int, name: str) -> None:
+        with self._lock:
+            self.game_names[game_index] = name
+
+    def games(self) -> List[Dict]:
+        """Per-game rollup: node wall time, LLM time, tokens and retries."""
+        with self._lock:
+            nodes, calls = list(self.nodes), list(self.llm_calls)
+        games: Dict[int, Dict] = {}
+        def entry(index: int) -> Dict:
+            return games.setdefault(index, {"game_index": index, "name": self.game_names.get(index, ""), "seconds": 0.0,
+                                            "llm_seconds": 0.0, "llm_calls": 0, "retries": 0,
+                                            "prompt_tokens": 0, "output_tokens": 0})
+        for node in nodes:
+            if node["game_index"] is not None:
+                entry(node["game_index"])["seconds"] += node["seconds"]
+        for call in calls:
+            if call.game_index is not None:
+                game = entry(call.game_index)
+                game["llm_seconds"] += call.latency_s
+                game["llm_calls"] += 1
+                game["retries"] += call.retries
+                game["prompt_tokens"] += call.prompt_tokens
+                game["output_tokens"] += call.output_tokens
+        return [games[i] for i in sorted(games)]
+
+    def report(self, slowest: int = 5) -> Dict:
+        """JSON-serialisable rollup of the run."""
+        with self._lock:
+            nodes, calls = list(self.nodes), list(self.llm_calls)
+        by_node: Dict[str, List[float]] = {}
+        for node in nodes:
+            by_node.setdefault(node["node"], []).append(node["seconds"])
+        live_calls = [c for c in calls if not c.cached]
+        prompt_tokens = sum(c.prompt_tokens for c in calls)
+        output_tokens = sum(c.output_tokens for c in calls)
+        games = self.games()
+        return {
+            "run_id": self.run_id,
+            "model": self.model,
+            "started_at": self.started_at,
+            "wall_s": round(time.time() - self.started_at, 3),
+            "nodes": {name: summarize(values) for name, values in sorted(by_node.items())},
+            "llm": {
+                "calls": len(calls),
+                "cache_hits": len(calls) - len(live_calls),
+                "failed": sum(1 for c in calls if not c.ok),
+                "retries": sum(c.retries for c in calls),
+                "rate_limit_wait_s": round(sum(c.rate_limit_wait_s for c in calls), 3),
+                "prompt_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "cached_prompt_tokens": sum(c.cached_prompt_tokens for c in calls),
+                "cost_usd": round(prompt_tokens / 1e6 * PRICE_INPUT_PER_MTOK + output_tokens / 1e6 * PRICE_OUTPUT_PER_MTOK, 4),
+                "latency": summarize([c.latency_s for c in live_calls]),
+                "json_repaired_calls": sum(1 for c in calls if c.json_repairs),
+                "json_repairs": dict(sorted(Counter(rule for c in calls for rule in c.json_repairs).items())),
+            },
+            "batching": self.batching(),
+            "hedging": self.hedging(),
+            "validation": self.validation(),
+            "manifest": {"reused_games": len(self.reused_games), "llm_calls_saved": len(self.reused_games)},
+            "games": games,
+            "slowest_games": sorted(games, key=lambda g: g["seconds"], reverse=True)[:slowest],
+        }
+
+    def to_prometheus(self, report: Optional[Dict] = None) -> str:
+        """Prometheus text exposition format (e.g. for node_exporter's textfile collector)."""
+        report = report or self.report()
+        run = f'run="{self.run_id}",model="{self.model}"'
+        llm = report["llm"]
+        lines = [
+            "# HELP game_pipeline_node_seconds_total Wall time spent in each graph node.",
+            "# TYPE game_pipeline_node_seconds_total counter",
+        ]
+        lines += [f'game_pipeline_node_seconds_total{{{run},node="{name}"}} {s["total_s"]}' for name, s in report["nodes"].items()]
+        lines += ["# HELP game_pipeline_node_runs_total Number of times each graph node ran.",
+                  "# TYPE game_pipeline_node_runs_total counter"]
+        lines += [f'game_pipeline_node_runs_total{{{run},node="{name}"}} {s["count"]}' for name, s in report["nodes"].items()]
+        lines += [
+            "# HELP game_pipeline_llm_calls_total LLM calls, including cache hits.",
+            "# TYPE game_pipeline_llm_calls_total counter",
+            f"game_pipeline_llm_calls_total{{{run}}} {llm['calls']}",
+            "# HELP game_pipeline_llm_cache_hits_total LLM calls served from the response cache.",
+            "# TYPE game_pipeline_llm_cache_hits_total counter",
+            f"game_pipeline_llm_cache_hits_total{{{run}}} {llm['cache_hits']}",
+            "# HELP game_pipeline_llm_retries_total Retries made by call_llm.",
+            "# TYPE game_pipeline_llm_retries_total counter",
+            f"game_pipeline_llm_retries_total{{{run}}} {llm['retries']}",
+            "# HELP game_pipeline_llm_tokens_total Tokens reported by usage_metadata.",
+            "# TYPE game_pipeline_llm_tokens_total counter",
+            f'game_pipeline_llm_tokens_total{{{run},type="prompt"}} {llm["prompt_tokens"]}',
+            f'game_pipeline_llm_tokens_total{{{run},type="output"}} {llm["output_tokens"]}',
+            "# HELP game_pipeline_llm_cost_usd_total Estimated LLM spend.",
+            "# TYPE game_pipeline_llm_cost_usd_total counter",
+            f"game_pipeline_llm_cost_usd_total{{{run}}} {llm['cost_usd']}",
+            "# HELP game_pipeline_llm_latency_seconds Latency of live (non-cached) LLM calls.",
+            "# TYPE game_pipeline_llm_latency_seconds summary",
+            f'game_pipeline_llm_latency_seconds{{{run},quantile="0.5"}} {llm["latency"]["p50_s"]}',
+            f'game_pipeline_llm_latency_seconds{{{run},quantile="0.9"}} {llm["latency"]["p90_s"]}',
+            f'game_pipeline_llm_latency_seconds{{{run},quantile="0.99"}} {llm["latency"]["p99_s"]}',
+            f"game_pipeline_llm_latency_seconds_sum{{{run}}} {llm['latency']['total_s']}",
+            f"game_pipeline_llm_latency_seconds_count{{{run}}} {llm['latency']['count']}",
+            "# HELP game_pipeline_llm_calls_saved_total Worker calls skipped because the workspace manifest matched.",
+            "# TYPE game_pipeline_llm_calls_saved_total counter",
+            f"game_pipeline_llm_calls_saved_total{{{run}}} {report['manifest']['llm_calls_saved']}",
+            "# HELP game_pipeline_llm_json_repairs_total Malformed LLM responses repaired without a new request, by repair rule.",
+            "# TYPE game_pipeline_llm_json_repairs_total counter",
+            *[f'game_pipeline_llm_json_repairs_total{{{run},rule="{rule}"}} {count}' for rule, count in llm["json_repairs"].items()],
+            "# HELP game_pipeline_worker_requests_total Worker requests sent in batched mode vs. per-game mode for the same games.",
+            "# TYPE game_pipeline_worker_requests_total counter",
+            f'game_pipeline_worker_requests_total{{{run},mode="batched"}} {report["batching"]["requests"]}',
+            f'game_pipeline_worker_requests_total{{{run},mode="per_game"}} {report["batching"]["per_game_requests"]}',
+            "# HELP game_pipeline_llm_hedged_requests_total Duplicate requests sent for slow LLM calls, and how many answered first.",
+            "# TYPE game_pipeline_llm_hedged_requests_total counter",
+            f'game_pipeline_llm_hedged_requests_total{{{run},result="sent"}} {report["hedging"]["hedged_calls"]}',
+            f'game_pipeline_llm_hedged_requests_total{{{run},result="won"}} {report["hedging"]["hedge_wins"]}',
+            "# HELP game_pipeline_llm_hedge_saved_seconds_total Latency saved by hedged requests that won.",
+            "# TYPE game_pipeline_llm_hedge_saved_seconds_total counter",
+            f"game_pipeline_llm_hedge_saved_seconds_total{{{run}}} {report['hedging']['latency_saved_s']}",
+            "# HELP game_pipeline_llm_timeouts_total LLM calls that hit the hard per-call timeout.",
+            "# TYPE game_pipeline_llm_timeouts_total counter",
+            f"game_pipeline_llm_timeouts_total{{{run}}} {report['hedging']['timeouts']}",
+            "# HELP game_pipeline_games_validated_total Saved games by validation outcome.",
+            "# TYPE game_pipeline_games_validated_total counter",
+            f'game_pipeline_games_validated_total{{{run},result="failed"}} {report["validation"]["failed"]}',
+            f'game_pipeline_games_validated_total{{{run},result="repaired"}} {report["validation"]["repaired"]}',
+            f'game_pipeline_games_validated_total{{{run},result="still_failing"}} {report["validation"]["still_failing"]}',
+            f'game_pipeline_games_validated_total{{{run},result="checked"}} {report["validation"]["checked"]}',
+            f'game_pipeline_games_validated_total{{{run},result="unchecked"}} {report["validation"]["unchecked"]}',
+            "# HELP game_pipeline_run_seconds Wall time of the run so far.",
+            "# TYPE game_pipeline_run_seconds gauge",
+            f"game_pipeline_run_seconds{{{run}}} {report['wall_s']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, directory: Path = METRICS_DIR) -> Dict:
+        """Writes <run_id>.json and <run_id>.prom and returns the report."""
+        report = self.report()
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"{self.run_id}.json").write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        (directory / f"{self.run_id}.prom").write_text(self.to_prometheus(report), encoding="utf-8")
+        return report
+
+
+# --- Current run / game, propagated to LangGraph worker threads through contextvars ---
+_current_run: ContextVar[Optional[RunMetrics]] = ContextVar("current_run_metrics", default=None)
+_current_game: ContextVar[Optional[int]] = ContextVar("current_game_index", default=None)
+
+
+def start_run(run_id: str, model: str = "") -> RunMetrics:
+    """Starts collecting metrics for the graph run executed by the calling thread."""
+    run = RunMetrics(run_id=run_id, model=model)
+    _current_run.set(run)
+    return run
+
+
+def current_run() -> Optional[RunMetrics]:
+    return _current_run.get()
+
+
+def current_game() -> Optional[int]:
+    return _current_game.get()
+
+
+@contextmanager
+def game_scope(game_index: Optional[int]) -> Iterator[None]:
+    """Attributes LLM calls made inside the block to the given game."""
+    token = _current_game.set(game_index)
+    try:
+        yield
+    finally:
+        _current_game.reset(token)
+
+
+def record_llm_call(record: LLMCallRecord) -> None:
+    run = _current_run.get()
+    if run is not None:
+        if record.game_index is None:
+            record.game_index = _current_game.get()
+        run.record_llm_call(record)
+
+
+def record_reused_game() -> None:
+    """Counts a game of the current run that was reused instead of regenerated."""
+    run = _current_run.get()
+    if run is not None:
+        run.record_reused_game(_current_game.get())
+
+
+def record_batch(games: int, generated: int, prompt_tokens_est: int, per_game_prompt_tokens_est: int,
+                 fallback_prompt_tokens_est: int) -> None:
+    """Records one batched worker call: how many games it asked for and how many came back usable."""
+    run = _current_run.get()
+    if run is not None:
+        run.record_batch({"games": games, "generated": generated, "prompt_tokens_est": prompt_tokens_est,
+                          "per_game_prompt_tokens_est": per_game_prompt_tokens_est,
+                          "fallback_prompt_tokens_est": fallback_prompt_tokens_est})
+
+
+def record_hedge_saving(seconds: float) -> None:
+    """Called when the request a hedge overtook finally finishes; may run on that request's thread."""
+    run = _current_run.get()
+    if run is not None:
+        run.record_hedge_saving(seconds)
+
+
+def record_validation(result: Dict, repair: bool = False) -> None:
+    """Records one game_validation result; repair=True for the check after a repair call."""
+    run = _current_run.get()
+    if run is not None:
+        run.record_validation({"ok": result["ok"], "repair": repair, "seconds": result.get("seconds", 0.0)})
+
+
+def label_game(game_index: int, name: str) -> None:
+    """Remembers the concept name of a game for the per-game report."""
+    run = _current_run.get()
+    if run is not None:
+        run.name_game(game_index, name)
+
+
+def timed_node(name: str, fn: Callable) -> Callable:
+    """Wraps a graph node to record its wall time (and game index for per-game nodes)."""
+    @functools.wraps(fn)
+    def wrapper(state, *args, **kwargs):
+        game_index = None
+        if name in PER_GAME_NODES:
+            game_index = state.get("game_index", state.get("current_game_index"))
+        started = time.perf_counter()
+        try:
+            with game_scope(game_index):
+                return fn(state, *args, **kwargs)
+        finally:
+            run = _current_run.get()
+            if run is not None:
+                run.record_node(name, time.perf_counter() - started, game_index)
+    return wrapper
+
+
+def load_report(run_id: str, directory: Path = METRICS_DIR) -> Optional[Dict]:
+    """Reads a report written by RunMetrics.write, if any."""
+    path = directory / f"{run_id}.json"
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
@@ -0,0 +1,129 @@
+# rate_limiter.py - Shared request/token limiter for Gemini calls
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, Tuple
+
+
+class TokenBucket:
+    """Classic token bucket: holds up to `capacity` units and refills continuously."""
+
+    def __init__(self, capacity: float, refill_per_second: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated_at = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket instead of forever
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float) -> None:
+        """Takes `amount` units; the balance may go negative to record debt."""
+        self._refill()
+        self.tokens -= amount
+
+    def drain(self) -> None:
+        """Empties the bucket, e.g. after the server told us we are over the limit."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limiter shared by all worker threads."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _buckets(self) -> Iterator[Tuple[TokenBucket, TokenBucket]]:
+        """Exclusive access to the (requests, tokens) buckets."""
+        with self._lock:
+            yield self.requests, self.tokens
+
+    def acquire(self, tokens: int) -> float:
+        """Blocks until one request and `tokens` tokens fit in the budget. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self._buckets() as (requests, token_bucket):
+                delay = max(requests.wait_time(1), token_bucket.wait_time(tokens))
+                if delay <= 0:
+                    requests.consume(1)
+                    token_bucket.consume(tokens)
+                    return waited
+            time.sleep(delay)
+            waited += delay
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Like acquire, but only if the budget allows it right now; optional extra requests never wait."""
+        with self._buckets() as (requests, token_bucket):
+            if requests.wait_time(1) > 0 or token_bucket.wait_time(tokens) > 0:
+                return False
+            requests.consume(1)
+            token_bucket.consume(tokens)
+            return True
+
+    def record_usage(self, actual_tokens: int, reserved_tokens: int) -> None:
+        """Settles the difference between the estimate passed to `acquire` and real usage."""
+        with self._buckets() as (_, token_bucket):
+            token_bucket.consume(actual_tokens - reserved_tokens)
+
+    def backoff(self) -> None:
+        """Called on HTTP 429: drains the request bucket so the next caller waits a full refill slot."""
+        with self._buckets() as (requests, _):
+            requests.drain()
+
+
+class SqliteRateLimiter(RateLimiter):
+    """RateLimiter whose bucket levels live in a SQLite file, so several processes (job workers) share one budget.
+
+    Every operation loads both buckets, updates them and writes them back in one IMMEDIATE
+    transaction. Levels are timestamped with the wall clock, which, unlike time.monotonic,
+    is comparable between processes.
+    """
+
+    def __init__(self, path: Path, requests_per_minute: float, tokens_per_minute: float):
+        super().__init__(requests_per_minute, tokens_per_minute)
+        self.requests.clock = self.tokens.clock = time.time
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+
+    @contextmanager
+    def _buckets(self) -> Iterator[Tuple[TokenBucket, TokenBucket]]:
+        buckets = {"requests": self.requests, "tokens": self.tokens}
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE") # Takes the write lock: other processes wait here
+            try:
+                rows = dict((name, (level, updated_at)) for name, level, updated_at
+                            in self._conn.execute("SELECT name, tokens, updated_at FROM buckets"))
+                now = time.time()
+                for name, bucket in buckets.items():
+                    bucket.tokens, bucket.updated_at = rows.get(name, (bucket.capacity, now))
+                yield self.requests, self.tokens
+                self._conn.executemany("INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                                       [(name, bucket.tokens, bucket.updated_at) for name, bucket in buckets.items()])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) used before the real count is known."""
+    return max(1, len(text) // 4)
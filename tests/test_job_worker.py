@@ -0,0 +1,37 @@
+# test_job_worker.py - The multi-process worker fleet drains the queue and exits
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+WORKER_TIMEOUT_S = 300 # Generous: spawned processes import the whole pipeline
+
+sys.path.insert(0, str(REPO_DIR))
+from job_queue import JobQueue  # noqa: E402
+
+
+class ExitWhenEmptyTest(unittest.TestCase):
+    def test_processes_exit_after_queue_is_drained(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, PYTHONPATH=str(REPO_DIR), LLM_BACKEND="fake", GOOGLE_API_KEY="test",
+                       FAKE_LLM_LATENCY="lognormal:0.01,0.1", MAX_GAMES="2", GAME_VALIDATION_WORKERS="2",
+                       JOB_DB=os.path.join(tmp, "jobs.sqlite3"), WORKSPACE_DIR=os.path.join(tmp, "workspace"))
+            queue = JobQueue(Path(env["JOB_DB"]))
+            self.addCleanup(queue.close)
+            for theme in ("vesmir", "zvierata"):
+                queue.submit(theme)
+            # Relative defaults (.llm_cache, .checkpoints, .logs, .metrics, ...) land in the temporary directory
+            try:
+                worker = subprocess.run([sys.executable, "-m", "job_worker", "--processes", "2", "--exit-when-empty"],
+                                        cwd=tmp, env=env, capture_output=True, text=True, timeout=WORKER_TIMEOUT_S)
+            except subprocess.TimeoutExpired:
+                self.fail(f"job_worker did not exit within {WORKER_TIMEOUT_S} s")
+            self.assertEqual(worker.returncode, 0, worker.stderr)
+            self.assertEqual([job["status"] for job in queue.list()], ["done", "done"])
+
+
+if __name__ == "__main__":
+    unittest.main()
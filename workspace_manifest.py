@@ -0,0 +1,95 @@
+# workspace_manifest.py - Records which prompt produced each game folder, so unchanged games are not regenerated
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from game_store import file_lock, folder_key
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+class WorkspaceManifest:
+    """JSON manifest in the workspace: game folder (relative path) -> fingerprint of the generating prompt and sha256 of each file.
+
+    A game can be reused when its fingerprint matches and every recorded file is still on disk
+    with the same hash; anything else (changed plan, other model, failed or edited game) is regenerated.
+    Several processes (job workers) may share one manifest: the file is re-read whenever it was
+    replaced, and every write re-reads and rewrites it under a lock file, so no update is lost.
+    """
+
+    def __init__(self, workspace_dir: Path):
+        self.path = workspace_dir / MANIFEST_NAME
+        self.lock_path = workspace_dir / f".{MANIFEST_NAME}.lock"
+        self._lock = threading.Lock()
+        self.games: Dict[str, Dict] = {}
+        self._version: Optional[Tuple[int, int, int]] = None
+        self._refresh()
+
+    def _file_version(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        # Every write replaces the file, so a new inode tells rewrites apart even within one mtime tick
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self) -> None:
+        """Reloads the manifest if another process rewrote it since the last read."""
+        version = self._file_version()
+        if version is None or version == self._version:
+            return
+        self._version = version
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") == MANIFEST_VERSION:
+                self.games = data.get("games", {})
+        except (ValueError, OSError):
+            pass # A broken manifest only costs a full regeneration
+
+    def lookup(self, folder_name: str, fingerprint: str) -> Optional[Path]:
+        """Returns the game folder if it was generated from `fingerprint` and is unchanged on disk."""
+        with self._lock:
+            self._refresh()
+            entry = self.games.get(folder_name)
+        if not entry or entry["fingerprint"] != fingerprint or not entry["files"]:
+            return None
+        game_dir = self.path.parent / folder_name
+        try:
+            if all(file_digest(game_dir / name) == digest for name, digest in entry["files"].items()):
+                return game_dir
+        except OSError:
+            pass
+        return None
+
+    def record(self, game_dir: Path, game_name: str, fingerprint: str, model: str, filenames: List[str]) -> None:
+        """Stores the entry for a completely saved game and rewrites the manifest atomically."""
+        files = {name: file_digest(game_dir / name) for name in filenames if (game_dir / name).is_file()}
+        with self._lock, file_lock(self.lock_path):
+            self._refresh()
+            self.games[folder_key(self.path.parent, game_dir)] = {"name": game_name, "fingerprint": fingerprint, "model": model,
+                                         "files": files, "updated_at": time.time()}
+            self._write()
+
+    def forget(self, folder_name: str) -> None:
+        """Drops a game, so the next run regenerates it."""
+        with self._lock, file_lock(self.lock_path):
+            self._refresh()
+            if self.games.pop(folder_name, None) is not None:
+                self._write()
+
+    def _write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps({"version": MANIFEST_VERSION, "games": self.games}, ensure_ascii=False, indent=1),
+                            encoding="utf-8")
+        os.replace(tmp_path, self.path)
+        self._version = self._file_version()